@@ -2,11 +2,13 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from bot.utils.permissions import check_admin_permissions
+from bot.utils.message_dispatcher import PRIORITY_ANNOUNCEMENT
 
 class AnnouncementCommands(commands.Cog):
-    def __init__(self, bot, config_manager):
+    def __init__(self, bot, config_manager, dispatcher):
         self.bot = bot
         self.config_manager = config_manager
+        self.dispatcher = dispatcher
 
     @app_commands.command(name="announcement", description="Send an announcement to the designated channel")
     @app_commands.describe(
@@ -25,15 +27,14 @@ class AnnouncementCommands(commands.Cog):
             guild_id = str(interaction.guild.id)
             config = self.config_manager.get_server_config(guild_id)
             
-            announcement_channel_id = config.get('announcement_channel')
-            if not announcement_channel_id:
+            if not config.announcement_channel:
                 await interaction.response.send_message(
                     "No announcement channel has been set. Use /set-announcement-channel first.",
                     ephemeral=True
                 )
                 return
             
-            channel = self.bot.get_channel(int(announcement_channel_id))
+            channel = self.bot.get_channel(config.announcement_channel)
             if not channel:
                 await interaction.response.send_message(
                     "The configured announcement channel no longer exists. Please set a new one.",
@@ -55,17 +56,21 @@ class AnnouncementCommands(commands.Cog):
             embed.timestamp = discord.utils.utcnow()
             embed.set_footer(text=f"Announced in {interaction.guild.name}")
             
-            await channel.send(embed=embed)
-            await interaction.response.send_message(
+            # The channel may be busy (e.g. with welcome images), answer the
+            # interaction first so it can't time out while the announcement waits
+            await interaction.response.defer(ephemeral=True)
+            await self.dispatcher.send(channel, PRIORITY_ANNOUNCEMENT, embed=embed)
+            await interaction.followup.send(
                 f"Announcement sent to {channel.mention}",
                 ephemeral=True
             )
             
         except Exception as e:
-            await interaction.response.send_message(
-                "An error occurred while sending the announcement. Please try again later.",
-                ephemeral=True
-            )
+            error = "An error occurred while sending the announcement. Please try again later."
+            if interaction.response.is_done():
+                await interaction.followup.send(error, ephemeral=True)
+            else:
+                await interaction.response.send_message(error, ephemeral=True)
             print(f"Error in announcement command: {e}")
 
     @app_commands.command(name="set-announcement-channel", description="Set the channel for announcements")
@@ -92,7 +97,7 @@ class AnnouncementCommands(commands.Cog):
                 )
                 return
             
-            self.config_manager.update_server_config(guild_id, {'announcement_channel': str(channel.id)})
+            self.config_manager.update_server_config(guild_id, {'announcement_channel': channel.id})
             
             await interaction.response.send_message(
                 f"Announcement channel set to {channel.mention}",
@@ -112,15 +117,14 @@ class AnnouncementCommands(commands.Cog):
             guild_id = str(interaction.guild.id)
             config = self.config_manager.get_server_config(guild_id)
             
-            announcement_channel_id = config.get('announcement_channel')
-            if not announcement_channel_id:
+            if not config.announcement_channel:
                 await interaction.response.send_message(
                     "No announcement channel has been set.",
                     ephemeral=True
                 )
                 return
             
-            channel = self.bot.get_channel(int(announcement_channel_id))
+            channel = self.bot.get_channel(config.announcement_channel)
             if not channel:
                 await interaction.response.send_message(
                     "The configured announcement channel no longer exists.",
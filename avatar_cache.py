@@ -0,0 +1,155 @@
+from PIL import Image
+from collections import OrderedDict
+import asyncio
+import os
+import re
+
+class AvatarCache:
+    """Processed (circular, resized) avatars keyed by Discord avatar key.
+
+    Recently used avatars are kept in memory and every avatar is also written
+    to disk, so they survive restarts. Both layers are size bounded and evict
+    the least recently used entries first. Disk reads, writes and evictions
+    run in the default executor, so they never block the event loop.
+    """
+
+    _SAFE_KEY = re.compile(r'^[A-Za-z0-9_]+$')
+
+    def __init__(self, directory="data/avatar_cache", max_memory_items=256, max_disk_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        # file name -> size in bytes, least recently used first
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self._writes = set()
+        self._ensure_directory()
+
+    def _ensure_directory(self):
+        """Create the cache directory and index the files already in it"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.png'):
+                    stat = os.stat(os.path.join(self.directory, name))
+                    entries.append((stat.st_mtime, name, stat.st_size))
+            for _, name, size in sorted(entries):
+                self._disk[name] = size
+                self._disk_bytes += size
+        except Exception as e:
+            print(f"Error indexing avatar cache: {e}")
+
+    async def get(self, key):
+        """Get a cached avatar image, or None"""
+        image = self._memory.get(key)
+        if image is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return image
+
+        name = self._file_name(key)
+        if name in self._disk:
+            loop = asyncio.get_running_loop()
+            try:
+                image = await loop.run_in_executor(None, self._read_file, name)
+                if name in self._disk:
+                    self._disk.move_to_end(name)
+                self._remember(key, image)
+                self.hits += 1
+                self.disk_hits += 1
+                return image
+            except Exception as e:
+                print(f"Error reading cached avatar: {e}")
+                if self._forget_file(name):
+                    await loop.run_in_executor(None, self._delete_files, [name])
+
+        self.misses += 1
+        return None
+
+    def put(self, key, image):
+        """Store a processed avatar image, writing it to disk in the background"""
+        self._remember(key, image)
+
+        name = self._file_name(key)
+        if name is None:
+            return
+        task = asyncio.create_task(self._write(name, image))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, name, image):
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(None, self._write_file, name, image)
+            self._forget_file(name)
+            self._disk[name] = size
+            self._disk_bytes += size
+            evicted = []
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                evicted.append(next(iter(self._disk)))
+                self._forget_file(evicted[-1])
+            if evicted:
+                await loop.run_in_executor(None, self._delete_files, evicted)
+        except Exception as e:
+            print(f"Error writing cached avatar: {e}")
+
+    async def close(self):
+        """Wait for avatars still being written to disk"""
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self):
+        """Get hit/miss counters and cache sizes"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'memory_items': len(self._memory),
+            'disk_items': len(self._disk),
+            'disk_bytes': self._disk_bytes
+        }
+
+    def _remember(self, key, image):
+        self._memory[key] = image
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _forget_file(self, name):
+        """Drop a file from the index, returns whether it was indexed"""
+        size = self._disk.pop(name, None)
+        if size is None:
+            return False
+        self._disk_bytes -= size
+        return True
+
+    # Called in the executor
+
+    def _read_file(self, name):
+        with Image.open(os.path.join(self.directory, name)) as f:
+            return f.copy()
+
+    def _write_file(self, name, image):
+        # Written under a temporary name, so a concurrent read never sees half a file
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp"
+        image.save(tmp_path, format='PNG')
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def _delete_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _file_name(self, key):
+        # Avatar keys are hashes, but never build a path from anything else
+        return f"{key}.png" if self._SAFE_KEY.match(key) else None
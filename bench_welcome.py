@@ -0,0 +1,181 @@
+"""Benchmark welcome image rendering.
+
+Synthetic avatars and backgrounds are served from a local HTTP server, so no
+network or Discord connection is needed. Every scenario renders the same card
+repeatedly and reports render time percentiles, peak memory and output size.
+
+    python -m bot.utils.bench_welcome [--iterations 50] [--output results.json]
+
+Results are printed as JSON (or written to ``--output``), with a short
+summary on stderr.
+"""
+import argparse
+import asyncio
+import io
+import json
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from aiohttp import web
+from PIL import Image
+from bot.utils.avatar_cache import AvatarCache
+from bot.utils.image_assets import assets
+from bot.utils.image_processor import ImageProcessor, OUTPUT_FORMATS
+
+AVATAR_SIZE = (128, 128)
+BACKGROUND_SIZE = (1920, 1080)
+
+
+def _synthetic_image(size, image_format):
+    """Encode a noisy gradient, so codecs can't compress it to nothing"""
+    img = Image.merge('RGB', (
+        Image.linear_gradient('L').resize(size),
+        Image.effect_noise(size, 64),
+        Image.linear_gradient('L').rotate(90).resize(size)
+    ))
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def _use_fallback_fonts():
+    """Make the shared asset registry find no font files"""
+    assets.configure()
+    assets.font_paths = {style: [] for style in assets.font_paths}
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def _serve_images():
+    """Start the stand-in image server, returns (runner, base URL)"""
+    images = {
+        'avatar.png': (_synthetic_image(AVATAR_SIZE, 'PNG'), 'image/png'),
+        'background.jpg': (_synthetic_image(BACKGROUND_SIZE, 'JPEG'), 'image/jpeg')
+    }
+
+    async def handle(request):
+        body, content_type = images[request.match_info['name']]
+        return web.Response(body=body, content_type=content_type)
+
+    app = web.Application()
+    app.router.add_get('/{name}', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def _run_scenario(name, base_url, iterations, background, fonts, output_format, cache_dir):
+    processor = ImageProcessor(avatar_cache=AvatarCache(directory=cache_dir), output_format=output_format)
+    if fonts == 'fallback':
+        _use_fallback_fonts()
+    bg_image_url = f"{base_url}/background.jpg" if background == 'custom' else None
+
+    times = []
+    sizes = []
+    tracemalloc.start()
+    try:
+        # The first render fills the background cache, like a guild's first join
+        for _ in range(iterations + 1):
+            start = time.perf_counter()
+            welcome_image = await processor.create_welcome_image(
+                "Benchmark User",
+                "Benchmark Server",
+                f"{base_url}/avatar.png",
+                bg_image_url,
+                1234,
+                guild_id="1"
+            )
+            times.append(time.perf_counter() - start)
+            if welcome_image is None:
+                raise RuntimeError(f"Scenario {name} failed to render")
+            sizes.append(welcome_image.size)
+        _, python_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        await processor.avatar_cache.close()
+        processor.close()
+        if fonts == 'fallback':
+            assets.configure()
+
+    warm = times[1:]
+    return {
+        'name': name,
+        'background': background,
+        'fonts': fonts,
+        'format': output_format,
+        'iterations': iterations,
+        'first_ms': times[0] * 1000,
+        'p50_ms': _percentile(warm, 50) * 1000,
+        'p95_ms': _percentile(warm, 95) * 1000,
+        'mean_ms': statistics.mean(warm) * 1000,
+        'python_peak_bytes': python_peak,
+        'output_bytes': statistics.mean(sizes[1:])
+    }
+
+
+async def run_benchmarks(iterations=50, formats=tuple(OUTPUT_FORMATS)):
+    """Run every scenario and return the results as a dict"""
+    runner, base_url = await _serve_images()
+    scenarios = [
+        (background, fonts, output_format)
+        for background in ('default', 'custom')
+        for fonts in ('present', 'fallback')
+        for output_format in formats
+    ]
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for background, fonts, output_format in scenarios:
+                name = f"{background}-bg/{fonts}-fonts/{output_format}"
+                results.append(await _run_scenario(
+                    name, base_url, iterations, background, fonts, output_format, cache_dir
+                ))
+    finally:
+        await runner.cleanup()
+
+    return {
+        'pillow_version': Image.__version__,
+        'python_version': sys.version.split()[0],
+        # Max resident set size of the whole run; Pillow's pixel buffers are
+        # not seen by tracemalloc, so check this for image memory
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'scenarios': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark welcome image rendering")
+    parser.add_argument('--iterations', type=int, default=50, help="renders per scenario")
+    parser.add_argument('--formats', nargs='+', choices=list(OUTPUT_FORMATS), default=list(OUTPUT_FORMATS))
+    parser.add_argument('--output', help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args.iterations, tuple(args.formats)))
+
+    for scenario in results['scenarios']:
+        print(
+            f"{scenario['name']:<36} p50 {scenario['p50_ms']:7.1f} ms  p95 {scenario['p95_ms']:7.1f} ms  "
+            f"{scenario['output_bytes'] / 1024:7.1f} KiB",
+            file=sys.stderr
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
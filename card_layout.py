@@ -0,0 +1,186 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+import json
+from bot.utils.welcome_template import Field, TemplateError, parse_template
+
+CARD_SIZE = (800, 400)
+
+# Values that can be used in the text of a card
+CARD_PLACEHOLDERS = ('user.name', 'server', 'server.name', 'member_count')
+
+FONT_STYLES = ('regular', 'bold')
+
+# Horizontal alignment -> Pillow text anchor (left/middle/right of the ascender line)
+TEXT_ANCHORS = {'left': 'la', 'center': 'ma', 'right': 'ra'}
+
+MAX_TEXT_LAYERS = 10
+
+# The welcome card as it has always looked
+DEFAULT_LAYOUT = {
+    'overlay': [0, 0, 0, 100],
+    'avatar': {'x': 100, 'y': 'center', 'size': 120, 'border': 4},
+    'texts': [
+        {'text': "Welcome", 'x': 250, 'y': 120, 'font': 'regular', 'size': 40, 'color': '#ffffff'},
+        {'text': "{user.name}", 'x': 250, 'y': 170, 'font': 'bold', 'size': 60, 'color': '#ffffff', 'max_width': 530, 'min_size': 24},
+        {'text': "to {server}", 'x': 250, 'y': 240, 'font': 'regular', 'size': 40, 'color': '#c8c8c8', 'max_width': 530, 'min_size': 20},
+        {'text': "Member #{member_count}", 'x': 250, 'y': 290, 'font': 'regular', 'size': 30, 'color': '#969696'}
+    ]
+}
+
+
+class LayoutError(ValueError):
+    """Raised for card layouts that are not valid"""
+    pass
+
+
+@dataclass(frozen=True)
+class AvatarLayer:
+    x: int
+    # None centres the avatar vertically
+    y: Optional[int]
+    size: int
+    border: int
+
+
+@dataclass(frozen=True)
+class TextLayer:
+    parts: Tuple[str, ...]
+    position: Tuple[int, int]
+    font: str
+    size: int
+    color: Tuple[int, int, int]
+    anchor: str
+    # Text wider than max_width is shrunk, down to min_size
+    max_width: Optional[int] = None
+    min_size: Optional[int] = None
+
+    def render(self, values):
+        """Fill in the placeholders, or None if one of them has no value"""
+        text = []
+        for part in self.parts:
+            if isinstance(part, Field):
+                part = values.get(part)
+                if part is None:
+                    return None
+            text.append(part)
+        return "".join(text)
+
+
+@dataclass(frozen=True)
+class RenderPlan:
+    """A validated layout, ready to draw. Plain data, so it can be sent to render processes"""
+    overlay: Optional[Tuple[int, int, int, int]]
+    avatar: Optional[AvatarLayer]
+    texts: Tuple[TextLayer, ...]
+
+    @property
+    def fonts(self):
+        """(style, size) of every font the plan draws with"""
+        return tuple(dict.fromkeys((text.font, text.size) for text in self.texts))
+
+
+def _check_keys(name, spec, allowed):
+    if not isinstance(spec, dict):
+        raise LayoutError(f"{name} must be an object")
+    unknown = set(spec) - set(allowed)
+    if unknown:
+        raise LayoutError(f"Unknown {name} setting: {', '.join(sorted(unknown))}")
+
+def _int(name, value, low, high):
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        raise LayoutError(f"{name} must be a number from {low} to {high}")
+    return value
+
+def _color(name, value, alpha=False):
+    channels = 4 if alpha else 3
+    if isinstance(value, str):
+        text = value.lstrip('#')
+        if len(text) in (6, 8) and len(text) <= channels * 2:
+            try:
+                return tuple(int(text[i:i + 2], 16) for i in range(0, len(text), 2))
+            except ValueError:
+                pass
+    elif isinstance(value, list) and len(value) in (3, channels):
+        return tuple(_int(name, channel, 0, 255) for channel in value)
+    raise LayoutError(f"{name} must be a hex colour like #3498db")
+
+def _compile_overlay(value):
+    color = _color('overlay', value, alpha=True)
+    # Colours without alpha are opaque
+    return color if len(color) == 4 else color + (255,)
+
+def _compile_avatar(spec):
+    _check_keys('avatar', spec, ('x', 'y', 'size', 'border'))
+    y = spec.get('y', 'center')
+    return AvatarLayer(
+        x=_int('avatar x', spec.get('x', 100), 0, CARD_SIZE[0]),
+        y=None if y == 'center' else _int('avatar y', y, 0, CARD_SIZE[1]),
+        size=_int('avatar size', spec.get('size', 120), 32, 256),
+        border=_int('avatar border', spec.get('border', 4), 0, 16)
+    )
+
+def _compile_text(index, spec):
+    name = f"text {index + 1}"
+    _check_keys(name, spec, ('text', 'x', 'y', 'font', 'size', 'color', 'align', 'max_width', 'min_size'))
+    text = spec.get('text')
+    if not isinstance(text, str) or not 0 < len(text) <= 200:
+        raise LayoutError(f"{name} needs a text of at most 200 characters")
+    try:
+        parts = parse_template(text, CARD_PLACEHOLDERS)
+    except TemplateError as e:
+        raise LayoutError(f"{name}: {e}") from None
+    font = spec.get('font', 'regular')
+    if font not in FONT_STYLES:
+        raise LayoutError(f"{name} font must be one of {', '.join(FONT_STYLES)}")
+    align = spec.get('align', 'left')
+    if align not in TEXT_ANCHORS:
+        raise LayoutError(f"{name} align must be one of {', '.join(TEXT_ANCHORS)}")
+    size = _int(f"{name} size", spec.get('size', 40), 8, 200)
+    max_width = spec.get('max_width')
+    return TextLayer(
+        parts=parts,
+        position=(_int(f"{name} x", spec.get('x'), 0, CARD_SIZE[0]), _int(f"{name} y", spec.get('y'), 0, CARD_SIZE[1])),
+        font=font,
+        size=size,
+        color=_color(f"{name} color", spec.get('color', '#ffffff')),
+        anchor=TEXT_ANCHORS[align],
+        max_width=None if max_width is None else _int(f"{name} max_width", max_width, 1, CARD_SIZE[0]),
+        min_size=None if max_width is None else _int(f"{name} min_size", spec.get('min_size', 8), 8, size)
+    )
+
+@lru_cache(maxsize=256)
+def compile_layout(source: str) -> RenderPlan:
+    """Validate a layout (as canonical JSON) and compile it into a render plan.
+
+    Plans are cached by layout, so they are built once per distinct layout.
+    """
+    spec = json.loads(source)
+    _check_keys('layout', spec, ('overlay', 'avatar', 'texts'))
+    overlay = spec.get('overlay')
+    avatar = spec.get('avatar')
+    texts = spec.get('texts', [])
+    if not isinstance(texts, list) or len(texts) > MAX_TEXT_LAYERS:
+        raise LayoutError(f"texts must be a list of at most {MAX_TEXT_LAYERS} text blocks")
+    return RenderPlan(
+        overlay=None if overlay is None else _compile_overlay(overlay),
+        avatar=None if avatar is None else _compile_avatar(avatar),
+        texts=tuple(_compile_text(index, text) for index, text in enumerate(texts))
+    )
+
+def parse_layout(value: Any) -> str:
+    """Validate a layout given as a dict or JSON text, returning canonical JSON"""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError as e:
+            raise LayoutError(f"Layout is not valid JSON: {e}") from None
+    if not isinstance(value, dict):
+        raise LayoutError("Layout must be a JSON object")
+    source = json.dumps(value, sort_keys=True, separators=(',', ':'))
+    compile_layout(source)
+    return source
+
+
+DEFAULT_LAYOUT_SOURCE = parse_layout(DEFAULT_LAYOUT)
+DEFAULT_PLAN = compile_layout(DEFAULT_LAYOUT_SOURCE)
@@ -1,7 +1,12 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+import io
+import json
 from bot.utils.permissions import check_admin_permissions
+from bot.utils.card_layout import DEFAULT_LAYOUT_SOURCE, LayoutError
+from bot.utils.guild_config import DEFAULT_RULES
+from bot.utils.welcome_template import TemplateError, compile_template
 
 class ConfigCommands(commands.Cog):
     def __init__(self, bot, config_manager):
@@ -32,7 +37,7 @@ class ConfigCommands(commands.Cog):
                 )
                 return
 
-            self.config_manager.update_server_config(guild_id, {'welcome_channel': str(channel.id)})
+            self.config_manager.update_server_config(guild_id, {'welcome_channel': channel.id})
 
             await interaction.response.send_message(
                 f"Welcome channel set to {channel.mention}",
@@ -47,7 +52,7 @@ class ConfigCommands(commands.Cog):
             print(f"Error in set-welcome-channel command: {e}")
 
     @app_commands.command(name="set-welcome-message", description="Set the welcome message text")
-    @app_commands.describe(message="Welcome message (use {user} for mention, {server} for server name)")
+    @app_commands.describe(message="Welcome message, placeholders: {user} {user.name} {user.id} {server} {server.id} {member_count}")
     async def set_welcome_message(self, interaction: discord.Interaction, message: str):
         if not check_admin_permissions(interaction.user, interaction.guild):
             await interaction.response.send_message(
@@ -56,6 +61,15 @@ class ConfigCommands(commands.Cog):
             )
             return
 
+        try:
+            compile_template(message)
+        except TemplateError as e:
+            await interaction.response.send_message(
+                f"Invalid welcome message: {e}",
+                ephemeral=True
+            )
+            return
+
         try:
             guild_id = str(interaction.guild.id)
             self.config_manager.update_server_config(guild_id, {'welcome_message': message})
@@ -105,6 +119,164 @@ class ConfigCommands(commands.Cog):
             )
             print(f"Error in set-welcome-image command: {e}")
 
+    @app_commands.command(name="set-welcome-gradient", description="Set the colours of the default welcome background")
+    @app_commands.describe(
+        top="Top colour as hex, e.g. #36393f",
+        bottom="Bottom colour as hex, e.g. #54575a"
+    )
+    async def set_welcome_gradient(self, interaction: discord.Interaction, top: str, bottom: str):
+        if not check_admin_permissions(interaction.user, interaction.guild):
+            await interaction.response.send_message(
+                "You need administrator permissions to use this command.",
+                ephemeral=True
+            )
+            return
+
+        try:
+            guild_id = str(interaction.guild.id)
+            self.config_manager.update_server_config(guild_id, {'welcome_gradient': [top, bottom]})
+
+            await interaction.response.send_message(
+                "Welcome background gradient updated successfully.",
+                ephemeral=True
+            )
+
+        except ValueError:
+            await interaction.response.send_message(
+                "Please use hex colours like #3498db.",
+                ephemeral=True
+            )
+        except Exception as e:
+            await interaction.response.send_message(
+                "An error occurred while setting the welcome gradient. Please try again later.",
+                ephemeral=True
+            )
+            print(f"Error in set-welcome-gradient command: {e}")
+
+    @app_commands.command(name="set-welcome-burst", description="Group welcome messages when many members join at once")
+    @app_commands.describe(
+        threshold="Joins within the window before they are grouped (0 to always welcome separately)",
+        window="Window length in seconds"
+    )
+    async def set_welcome_burst(self, interaction: discord.Interaction, threshold: app_commands.Range[int, 0, 100], window: app_commands.Range[int, 1, 300] = 10):
+        if not check_admin_permissions(interaction.user, interaction.guild):
+            await interaction.response.send_message(
+                "You need administrator permissions to use this command.",
+                ephemeral=True
+            )
+            return
+
+        try:
+            guild_id = str(interaction.guild.id)
+            self.config_manager.update_server_config(guild_id, {
+                'welcome_burst_threshold': threshold,
+                'welcome_burst_window': window
+            })
+
+            if threshold:
+                message = f"More than {threshold} joins within {window} seconds will be welcomed in one message."
+            else:
+                message = "Every member will be welcomed with their own message."
+            await interaction.response.send_message(message, ephemeral=True)
+
+        except Exception as e:
+            await interaction.response.send_message(
+                "An error occurred while setting the welcome burst limits. Please try again later.",
+                ephemeral=True
+            )
+            print(f"Error in set-welcome-burst command: {e}")
+
+    @app_commands.command(name="set-welcome-layout", description="Set the layout of the welcome card as JSON")
+    @app_commands.describe(layout="Layout JSON (see /view-welcome-layout), leave empty for the default card")
+    async def set_welcome_layout(self, interaction: discord.Interaction, layout: str = None):
+        if not check_admin_permissions(interaction.user, interaction.guild):
+            await interaction.response.send_message(
+                "You need administrator permissions to use this command.",
+                ephemeral=True
+            )
+            return
+
+        try:
+            guild_id = str(interaction.guild.id)
+            self.config_manager.update_server_config(guild_id, {'welcome_layout': layout})
+
+            await interaction.response.send_message(
+                "Welcome card layout updated successfully." if layout else "Welcome card layout reset to the default.",
+                ephemeral=True
+            )
+
+        except LayoutError as e:
+            await interaction.response.send_message(
+                f"Invalid layout: {e}",
+                ephemeral=True
+            )
+        except Exception as e:
+            await interaction.response.send_message(
+                "An error occurred while setting the welcome layout. Please try again later.",
+                ephemeral=True
+            )
+            print(f"Error in set-welcome-layout command: {e}")
+
+    @app_commands.command(name="view-welcome-layout", description="View the layout of the welcome card")
+    async def view_welcome_layout(self, interaction: discord.Interaction):
+        try:
+            guild_id = str(interaction.guild.id)
+            config = self.config_manager.get_server_config(guild_id)
+            layout = json.loads(config.welcome_layout or DEFAULT_LAYOUT_SOURCE)
+            text = json.dumps(layout, indent=2)
+
+            if len(text) < 1900:
+                await interaction.response.send_message(f"```json\n{text}\n```", ephemeral=True)
+            else:
+                await interaction.response.send_message(
+                    file=discord.File(io.BytesIO(text.encode()), filename="welcome_layout.json"),
+                    ephemeral=True
+                )
+
+        except Exception as e:
+            await interaction.response.send_message(
+                "An error occurred while getting the welcome layout. Please try again later.",
+                ephemeral=True
+            )
+            print(f"Error in view-welcome-layout command: {e}")
+
+    @app_commands.command(name="set-welcome-format", description="Set the file format of welcome images")
+    @app_commands.describe(
+        format="Image format (WebP and JPEG are smaller, PNG is lossless)",
+        quality="Quality for WebP and JPEG (1-100)"
+    )
+    @app_commands.choices(format=[
+        app_commands.Choice(name="PNG", value="png"),
+        app_commands.Choice(name="WebP", value="webp"),
+        app_commands.Choice(name="JPEG", value="jpeg")
+    ])
+    async def set_welcome_format(self, interaction: discord.Interaction, format: app_commands.Choice[str], quality: app_commands.Range[int, 1, 100] = None):
+        if not check_admin_permissions(interaction.user, interaction.guild):
+            await interaction.response.send_message(
+                "You need administrator permissions to use this command.",
+                ephemeral=True
+            )
+            return
+
+        try:
+            guild_id = str(interaction.guild.id)
+            self.config_manager.update_server_config(guild_id, {
+                'welcome_image_format': format.value,
+                'welcome_image_quality': quality
+            })
+
+            await interaction.response.send_message(
+                f"Welcome images will be sent as {format.name}.",
+                ephemeral=True
+            )
+
+        except Exception as e:
+            await interaction.response.send_message(
+                "An error occurred while setting the welcome image format. Please try again later.",
+                ephemeral=True
+            )
+            print(f"Error in set-welcome-format command: {e}")
+
     @app_commands.command(name="set-mod-log-channel", description="Set the channel for moderation logs")
     @app_commands.describe(channel="The channel where moderation logs will be sent")
     async def set_mod_log_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
@@ -129,7 +301,7 @@ class ConfigCommands(commands.Cog):
                 )
                 return
 
-            self.config_manager.update_server_config(guild_id, {'mod_log_channel': str(channel.id)})
+            self.config_manager.update_server_config(guild_id, {'mod_log_channel': channel.id})
 
             await interaction.response.send_message(
                 f"Moderation log channel set to {channel.mention}",
@@ -162,9 +334,8 @@ class ConfigCommands(commands.Cog):
             )
 
             # Welcome settings
-            welcome_channel = config.get('welcome_channel')
-            if welcome_channel:
-                channel = self.bot.get_channel(int(welcome_channel))
+            if config.welcome_channel:
+                channel = self.bot.get_channel(config.welcome_channel)
                 embed.add_field(
                     name="Welcome Channel",
                     value=channel.mention if channel else "Channel not found",
@@ -173,13 +344,12 @@ class ConfigCommands(commands.Cog):
             else:
                 embed.add_field(name="Welcome Channel", value="Not set", inline=False)
 
-            welcome_message = config.get('welcome_message', 'Not set')
+            welcome_message = config.welcome_message
             embed.add_field(name="Welcome Message", value=welcome_message[:100] + "..." if len(welcome_message) > 100 else welcome_message, inline=False)
 
             # Announcement settings
-            announcement_channel = config.get('announcement_channel')
-            if announcement_channel:
-                channel = self.bot.get_channel(int(announcement_channel))
+            if config.announcement_channel:
+                channel = self.bot.get_channel(config.announcement_channel)
                 embed.add_field(
                     name="Announcement Channel",
                     value=channel.mention if channel else "Channel not found",
@@ -189,9 +359,8 @@ class ConfigCommands(commands.Cog):
                 embed.add_field(name="Announcement Channel", value="Not set", inline=False)
 
             # Moderation settings
-            mod_log_channel = config.get('mod_log_channel')
-            if mod_log_channel:
-                channel = self.bot.get_channel(int(mod_log_channel))
+            if config.mod_log_channel:
+                channel = self.bot.get_channel(config.mod_log_channel)
                 embed.add_field(
                     name="Moderation Log Channel",
                     value=channel.mention if channel else "Channel not found",
@@ -201,21 +370,18 @@ class ConfigCommands(commands.Cog):
                 embed.add_field(name="Moderation Log Channel", value="Not set", inline=False)
 
             # Rules settings
-            rules_count = len(config.get('rules', []))
-            embed.add_field(name="Custom Rules", value=f"{rules_count} rules set" if rules_count > 0 else "Using default rules", inline=False)
+            rules_count = len(config.rules)
+            embed.add_field(name="Custom Rules", value="Using default rules" if config.rules is DEFAULT_RULES else f"{rules_count} rules set", inline=False)
 
-            rules_image = config.get('rules_image')
-            embed.add_field(name="Rules Image", value="Set" if rules_image else "Not set", inline=False)
+            embed.add_field(name="Rules Image", value="Set" if config.rules_image else "Not set", inline=False)
 
-            welcome_bg = config.get('welcome_bg_image')
-            embed.add_field(name="Welcome Background", value="Set" if welcome_bg else "Not set", inline=False)
+            embed.add_field(name="Welcome Background", value="Set" if config.welcome_bg_image else "Not set", inline=False)
 
             # Auto roles settings
-            auto_roles = config.get('auto_roles', [])
-            if auto_roles:
+            if config.auto_roles:
                 role_names = []
-                for role_id in auto_roles:
-                    role = interaction.guild.get_role(int(role_id))
+                for role_id in config.auto_roles:
+                    role = interaction.guild.get_role(role_id)
                     if role:
                         role_names.append(role.name)
                     else:
@@ -260,15 +426,15 @@ class ConfigCommands(commands.Cog):
                 # Check if it's a role mention
                 if part.startswith('<@&') and part.endswith('>'):
                     role_id = part[3:-1]
-                    role = interaction.guild.get_role(int(role_id))
+                    role = interaction.guild.get_role(int(role_id)) if role_id.isdigit() else None
                     if role:
-                        role_ids.append(str(role.id))
+                        role_ids.append(role.id)
                         role_names.append(role.name)
                 else:
                     # Try to find role by name
                     role = discord.utils.get(interaction.guild.roles, name=part)
                     if role:
-                        role_ids.append(str(role.id))
+                        role_ids.append(role.id)
                         role_names.append(role.name)
             
             if not role_ids:
@@ -284,7 +450,7 @@ class ConfigCommands(commands.Cog):
             invalid_roles = []
             
             for role_id in role_ids:
-                role = interaction.guild.get_role(int(role_id))
+                role = interaction.guild.get_role(role_id)
                 if role and role < bot_member.top_role:
                     valid_roles.append(role_id)
                 else:
@@ -300,7 +466,7 @@ class ConfigCommands(commands.Cog):
             # Save configuration
             self.config_manager.update_server_config(guild_id, {'auto_roles': valid_roles})
             
-            valid_role_names = [interaction.guild.get_role(int(rid)).name for rid in valid_roles]
+            valid_role_names = [interaction.guild.get_role(rid).name for rid in valid_roles]
             response = f"Auto roles set: {', '.join(valid_role_names)}"
             
             if invalid_roles:
@@ -352,9 +518,7 @@ class ConfigCommands(commands.Cog):
         try:
             guild_id = str(interaction.guild.id)
             config = self.config_manager.get_server_config(guild_id)
-            auto_roles = config.get('auto_roles', [])
-            
-            if not auto_roles:
+            if not config.auto_roles:
                 await interaction.response.send_message(
                     "No auto roles are currently configured.",
                     ephemeral=True
@@ -367,8 +531,8 @@ class ConfigCommands(commands.Cog):
             )
             
             role_list = []
-            for role_id in auto_roles:
-                role = interaction.guild.get_role(int(role_id))
+            for role_id in config.auto_roles:
+                role = interaction.guild.get_role(role_id)
                 if role:
                     role_list.append(f"• {role.name}")
                 else:
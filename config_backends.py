@@ -0,0 +1,230 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import Dict, Any, Optional
+
+class ConfigBackend:
+    """Storage interface behind ConfigManager.
+
+    Changes are passed as ``{guild_id: updates}`` where ``updates`` holds only
+    the keys that changed, or ``None`` when the guild's config was removed.
+    Backends that can read a single guild cheaply set ``supports_lazy_load``
+    and implement ``load``, which lets ConfigManager load guilds on demand.
+    """
+
+    supports_lazy_load = False
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Load the stored configuration of every guild"""
+        raise NotImplementedError
+
+    def load(self, guild_id: str) -> Optional[Dict[str, Any]]:
+        """Load the stored configuration of one guild, if there is one"""
+        return self.load_all().get(guild_id)
+
+    def write(self, changes: Dict[str, Optional[Dict[str, Any]]]):
+        """Persist a batch of guild changes"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any open files or connections"""
+        pass
+
+
+class SqliteBackend(ConfigBackend):
+    """One row per guild in a SQLite database running in WAL mode"""
+
+    supports_lazy_load = True
+
+    _SELECT_ALL = "SELECT guild_id, data FROM guild_configs"
+    _SELECT_ONE = "SELECT data FROM guild_configs WHERE guild_id = ?"
+    _UPSERT = (
+        "INSERT INTO guild_configs (guild_id, data) VALUES (?, ?) "
+        "ON CONFLICT(guild_id) DO UPDATE SET data = excluded.data"
+    )
+    _DELETE = "DELETE FROM guild_configs WHERE guild_id = ?"
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        # Writes may come from the executor used by ConfigManager.flush()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS guild_configs ("
+            "guild_id TEXT PRIMARY KEY, "
+            "data TEXT NOT NULL)"
+        )
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(self._SELECT_ALL).fetchall()
+        return {guild_id: json.loads(data) for guild_id, data in rows}
+
+    def load(self, guild_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(self._SELECT_ONE, (guild_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write(self, changes: Dict[str, Optional[Dict[str, Any]]]):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for guild_id, updates in changes.items():
+                    if updates is None:
+                        self._conn.execute(self._DELETE, (guild_id,))
+                        continue
+                    row = self._conn.execute(self._SELECT_ONE, (guild_id,)).fetchone()
+                    config = json.loads(row[0]) if row else {}
+                    config.update(updates)
+                    self._conn.execute(self._UPSERT, (guild_id, self._dumps(config)))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def replace_all(self, configs: Dict[str, Dict[str, Any]]):
+        """Write full configs for many guilds in a single transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    self._UPSERT,
+                    ((guild_id, self._dumps(config)) for guild_id, config in configs.items())
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def is_empty(self) -> bool:
+        """Check if no guild has been stored yet"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM guild_configs LIMIT 1").fetchone() is None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _dumps(config: Dict[str, Any]) -> str:
+        return json.dumps(config, ensure_ascii=False, separators=(',', ':'))
+
+
+class ShardedJsonBackend(ConfigBackend):
+    """One JSON file per guild inside a directory"""
+
+    supports_lazy_load = True
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        configs = {}
+        for guild_id in self._guild_ids():
+            config = self.load(guild_id)
+            if config is not None:
+                configs[guild_id] = config
+        return configs
+
+    def load(self, guild_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(guild_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def write(self, changes: Dict[str, Optional[Dict[str, Any]]]):
+        for guild_id, updates in changes.items():
+            if updates is None:
+                try:
+                    os.remove(self._path(guild_id))
+                except FileNotFoundError:
+                    pass
+                continue
+            config = self.load(guild_id) or {}
+            config.update(updates)
+            self._write_file(guild_id, config)
+
+    def replace_all(self, configs: Dict[str, Dict[str, Any]]):
+        """Write full configs for many guilds"""
+        for guild_id, config in configs.items():
+            self._write_file(guild_id, config)
+
+    def is_empty(self) -> bool:
+        """Check if no guild has been stored yet"""
+        return next(self._guild_ids(), None) is None
+
+    def _guild_ids(self):
+        """IDs of the guilds with a file, ignoring any other files in the directory"""
+        for name in os.listdir(self.directory):
+            guild_id = name[:-len(".json")]
+            if name.endswith(".json") and guild_id.isdigit():
+                yield guild_id
+
+    def _path(self, guild_id: str) -> str:
+        # Guild IDs are numeric snowflakes; refuse anything that could escape the directory
+        if not guild_id.isdigit():
+            raise ValueError(f"Invalid guild ID: {guild_id!r}")
+        return os.path.join(self.directory, f"{guild_id}.json")
+
+    def _write_file(self, guild_id: str, config: Dict[str, Any]):
+        path = self._path(guild_id)
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_file, path)
+
+
+def create_backend(kind: str, config_file: str) -> ConfigBackend:
+    """Create the storage backend selected by name ("json", "sqlite" or "sharded")"""
+    from bot.utils.config_journal import ConfigJournal
+
+    if kind == "json":
+        return ConfigJournal(config_file)
+    if kind == "sqlite":
+        backend = SqliteBackend(os.path.splitext(config_file)[0] + ".db")
+    elif kind == "sharded":
+        backend = ShardedJsonBackend(os.path.join(os.path.dirname(config_file), "guilds"))
+    else:
+        raise ValueError(f"Unknown config backend: {kind}")
+    migrate_from_json(config_file, backend)
+    return backend
+
+
+def migrate_from_json(json_file: str, backend: ConfigBackend) -> int:
+    """Copy configs from the JSON snapshot and journal into an empty backend.
+
+    The JSON files are renamed with a ``.migrated`` suffix afterwards, so the
+    migration only ever runs once. Returns the number of guilds migrated.
+    """
+    from bot.utils.config_journal import ConfigJournal
+
+    journal = ConfigJournal(json_file)
+    if not os.path.exists(journal.snapshot_file) and not os.path.exists(journal.journal_file):
+        return 0
+    if not backend.is_empty():
+        print(f"Skipping config migration, {type(backend).__name__} already has data")
+        return 0
+
+    configs = journal.load_all()
+    journal.close()
+    backend.replace_all(configs)
+
+    for path in (journal.snapshot_file, journal.journal_file):
+        if os.path.exists(path):
+            os.replace(path, f"{path}.migrated")
+
+    print(f"Migrated {len(configs)} server configs from {json_file} to {type(backend).__name__}")
+    return len(configs)
+
+
+if __name__ == '__main__':
+    # python -m bot.utils.config_backends [data/server_configs.json] [sqlite|sharded]
+    source = sys.argv[1] if len(sys.argv) > 1 else "data/server_configs.json"
+    target = create_backend(sys.argv[2] if len(sys.argv) > 2 else "sqlite", source)
+    target.close()
@@ -0,0 +1,113 @@
+import json
+import os
+from typing import Dict, Any, Optional
+from bot.utils.config_backends import ConfigBackend
+
+class ConfigJournal(ConfigBackend):
+    """Snapshot file plus an append-only journal of per-guild changes.
+
+    Every change is written as one JSON line to the journal, so the cost of a
+    write is proportional to the change rather than to the number of guilds.
+    The journal is periodically folded back into the snapshot (compaction).
+    """
+
+    def __init__(self, snapshot_file: str, journal_file: Optional[str] = None, compact_every: int = 1000):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file or f"{snapshot_file}.journal"
+        self.compact_every = compact_every
+        self.entries = 0
+        self._handle = None
+
+    def _replay(self) -> Dict[str, Dict[str, Any]]:
+        """Load the snapshot and replay the journal on top of it"""
+        configs = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                configs = json.load(f)
+
+        self.entries = 0
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from an interrupted write, ignore it
+                        continue
+                    self._apply(configs, entry)
+                    self.entries += 1
+
+        return configs
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        return self._replay()
+
+    def write(self, changes: Dict[str, Optional[Dict[str, Any]]]):
+        for guild_id, updates in changes.items():
+            self.append(guild_id, updates)
+        if self.needs_compaction():
+            self.compact()
+
+    def append(self, guild_id: str, updates: Optional[Dict[str, Any]]):
+        """Append a change for one guild; ``None`` means the guild was removed"""
+        if updates is None:
+            entry = {"guild": guild_id, "removed": True}
+        else:
+            entry = {"guild": guild_id, "set": updates}
+
+        if self._handle is None:
+            self._handle = self._open_journal()
+        self._handle.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._handle.flush()
+        self.entries += 1
+
+    def _open_journal(self):
+        """Open the journal for appending, ending a torn last line first"""
+        torn = False
+        if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > 0:
+            with open(self.journal_file, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        handle = open(self.journal_file, 'a', encoding='utf-8')
+        if torn:
+            # Otherwise the next entry would be appended to the torn line and
+            # dropped with it on replay
+            handle.write("\n")
+        return handle
+
+    def needs_compaction(self) -> bool:
+        """Check if the journal has grown past the compaction threshold"""
+        return self.entries >= self.compact_every
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and start an empty journal"""
+        configs = self._replay()
+
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(configs, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+
+        # Replaying the old journal over the new snapshot is harmless, so a
+        # crash between the replace above and the truncate below loses nothing
+        self.close()
+        open(self.journal_file, 'w', encoding='utf-8').close()
+        self.entries = 0
+
+    def close(self):
+        """Close the journal file handle"""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    @staticmethod
+    def _apply(configs: Dict[str, Dict[str, Any]], entry: Dict[str, Any]):
+        guild_id = entry.get("guild")
+        if guild_id is None:
+            return
+        if entry.get("removed"):
+            configs.pop(guild_id, None)
+        else:
+            configs.setdefault(guild_id, {}).update(entry.get("set", {}))
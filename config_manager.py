@@ -1,12 +1,38 @@
-import json
+import asyncio
 import os
-from typing import Dict, Any
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from bot.utils.config_backends import ConfigBackend, create_backend
+from bot.utils.guild_config import GuildConfig, DEFAULT_CONFIG
 
 class ConfigManager:
-    def __init__(self, config_file="data/server_configs.json"):
+    def __init__(self, config_file="data/server_configs.json", backend="json",
+                 async_writes=False, flush_delay=2.0, max_cached_guilds=None, cache_ttl=None):
         self.config_file = config_file
-        self.configs = {}
+        # Loaded GuildConfig objects, least recently used first
+        self.configs = OrderedDict()
+        self._last_used = {}
         self._ensure_data_directory()
+        # backend is either a ConfigBackend instance or its name ("json", "sqlite", "sharded")
+        if isinstance(backend, ConfigBackend):
+            self.backend = backend
+        else:
+            self.backend = create_backend(backend, config_file)
+        # Backends that can load a single guild are read on first access, and
+        # cold guilds are evicted past max_cached_guilds or after cache_ttl seconds
+        self.lazy = self.backend.supports_lazy_load
+        self.max_cached_guilds = max_cached_guilds
+        self.cache_ttl = cache_ttl
+        # With async_writes, changes are buffered per guild and written from
+        # an executor at most flush_delay seconds after the first change
+        self.async_writes = async_writes
+        self.flush_delay = flush_delay
+        self._pending = {}
+        self._flushing = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._listeners = []
         self._load_configs()
 
     def _ensure_data_directory(self):
@@ -14,69 +40,229 @@ class ConfigManager:
         os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
 
     def _load_configs(self):
-        """Load configurations from file"""
+        """Load configurations from the storage backend"""
+        self._last_used = {}
+        if self.lazy:
+            # Guilds are loaded on first access instead
+            self.configs = OrderedDict()
+            return
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    self.configs = json.load(f)
-            else:
-                self.configs = {}
+            stored = self.backend.load_all()
+            self.configs = OrderedDict(
+                (guild_id, self._parse_stored(guild_id, config))
+                for guild_id, config in stored.items()
+            )
         except Exception as e:
             print(f"Error loading configs: {e}")
-            self.configs = {}
+            self.configs = OrderedDict()
+
+    def _parse_stored(self, guild_id: str, data: Optional[Dict[str, Any]]) -> GuildConfig:
+        """Validate stored data, falling back to defaults for unusable options"""
+        if not data:
+            return DEFAULT_CONFIG
+        errors = []
+        config = GuildConfig.from_dict(data, errors)
+        for error in errors:
+            print(f"Invalid stored option for {guild_id}, using its default: {error}")
+        return config
+
+    def _get_config(self, guild_id: str) -> GuildConfig:
+        """Get the config of a guild, loading it if needed"""
+        config = self.configs.get(guild_id)
+        if config is None:
+            stored = None
+            # A guild whose removal is still pending must not be read back
+            if self.lazy and not (guild_id in self._pending and self._pending[guild_id] is None):
+                try:
+                    stored = self.backend.load(guild_id)
+                except Exception as e:
+                    print(f"Error loading config for {guild_id}: {e}")
+            # Defaults are rebuilt on load, so nothing needs to be written yet
+            config = self._parse_stored(guild_id, stored)
+            self.configs[guild_id] = config
+        else:
+            self.configs.move_to_end(guild_id)
+
+        if self.lazy:
+            self._last_used[guild_id] = time.monotonic()
+            self._evict_cold_guilds()
+        return config
+
+    def _evict_cold_guilds(self):
+        """Drop least recently used guilds past the size cap or the TTL"""
+        if self.max_cached_guilds is None and self.cache_ttl is None:
+            return
+        now = time.monotonic()
+        # Only the coldest guild is inspected each step, and the most recently
+        # used guild (last in order) is never reached
+        for _ in range(len(self.configs) - 1):
+            guild_id = next(iter(self.configs))
+            over_cap = self.max_cached_guilds is not None and len(self.configs) > self.max_cached_guilds
+            expired = self.cache_ttl is not None and now - self._last_used.get(guild_id, now) > self.cache_ttl
+            if not over_cap and not expired:
+                # Guilds are ordered by last use, so the rest are warmer
+                break
+            if guild_id in self._pending or guild_id in self._flushing:
+                # Unwritten changes must stay in memory until flushed
+                self.configs.move_to_end(guild_id)
+                continue
+            del self.configs[guild_id]
+            self._last_used.pop(guild_id, None)
+
+    def _save_change(self, guild_id: str, updates: Optional[Dict[str, Any]]):
+        """Persist a guild change now, or mark the guild dirty in async mode"""
+        self._add_pending(guild_id, updates)
+        if self.async_writes:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                # No event loop yet (e.g. during startup), write synchronously
+                pass
+            else:
+                self._schedule_flush()
+                return
 
-    def _save_configs(self):
-        """Save configurations to file"""
+        changes, self._pending = self._pending, {}
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.configs, f, indent=2, ensure_ascii=False)
+            self._write_changes(changes)
         except Exception as e:
+            # Kept pending, so they are written again with the next change
             print(f"Error saving configs: {e}")
+            self._restore_pending(changes)
+
+    def _add_pending(self, guild_id: str, updates: Optional[Dict[str, Any]]):
+        """Merge a change into the changes waiting to be written"""
+        if updates is None:
+            self._pending[guild_id] = None
+        elif guild_id in self._pending and self._pending[guild_id] is None:
+            # Removed and re-created before the flush: write the whole config
+            self._pending[guild_id] = self.configs[guild_id].to_dict()
+        else:
+            self._pending.setdefault(guild_id, {}).update(updates)
+
+    def _restore_pending(self, changes: Dict[str, Optional[Dict[str, Any]]]):
+        """Put back changes that failed to write, under any newer pending ones"""
+        for guild_id, updates in changes.items():
+            if guild_id not in self._pending:
+                self._pending[guild_id] = updates
+                continue
+            newer = self._pending[guild_id]
+            if newer is None:
+                continue
+            if updates is None:
+                # The removal was not written, so the stored config is stale
+                if guild_id in self.configs:
+                    self._pending[guild_id] = self.configs[guild_id].to_dict()
+                continue
+            self._pending[guild_id] = {**updates, **newer}
+
+    def _schedule_flush(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    def _write_changes(self, changes: Dict[str, Optional[Dict[str, Any]]]):
+        """Hand a batch of guild changes to the storage backend"""
+        self.backend.write(changes)
+
+    async def _delayed_flush(self):
+        """Wait for more changes to coalesce, then flush them"""
+        try:
+            await asyncio.sleep(self.flush_delay)
+        finally:
+            self._flush_task = None
+        await self.flush()
 
-    def get_server_config(self, guild_id: str) -> Dict[str, Any]:
-        """Get configuration for a specific server"""
-        if guild_id not in self.configs:
-            self.configs[guild_id] = self._get_default_config()
-            self._save_configs()
-        return self.configs[guild_id].copy()
+    async def flush(self):
+        """Write all pending changes off the event loop.
+
+        Changes that fail to write stay pending and are retried later.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            changes, self._pending = self._pending, {}
+            self._flushing = set(changes)
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self._write_changes, changes)
+            except Exception as e:
+                print(f"Error saving configs, retrying in {self.flush_delay}s: {e}")
+                self._restore_pending(changes)
+                self._schedule_flush()
+            finally:
+                self._flushing = set()
+
+    async def close(self):
+        """Flush pending changes and release the backend, used on shutdown"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._flush_task is not None:
+            # The last flush failed, nothing more can be done on shutdown
+            self._flush_task.cancel()
+            self._flush_task = None
+            print(f"Could not save config changes of {len(self._pending)} servers")
+        self.backend.close()
+
+    def get_server_config(self, guild_id: str) -> GuildConfig:
+        """Get the configuration for a specific server.
+
+        GuildConfig is immutable, so the cached object is returned as is.
+        Use update_server_config to change it.
+        """
+        return self._get_config(guild_id)
 
     def update_server_config(self, guild_id: str, updates: Dict[str, Any]):
-        """Update configuration for a specific server"""
-        if guild_id not in self.configs:
-            self.configs[guild_id] = self._get_default_config()
-        
-        self.configs[guild_id].update(updates)
-        self._save_configs()
-
-    def _get_default_config(self) -> Dict[str, Any]:
-        """Get default configuration for a new server"""
-        return {
-            "welcome_channel": None,
-            "welcome_message": "Welcome to {server}, {user}! Please read the rules and enjoy your stay.",
-            "welcome_bg_image": None,
-            "announcement_channel": None,
-            "mod_log_channel": None,
-            "rules": [
-                "Hormati semua anggota server",
-                "Dilarang spam atau promosi berlebihan",
-                "Jaga percakapan tetap sopan dan ramah",
-                "Gunakan channel sesuai dengan tujuannya",
-                "Dilarang melakukan harassment atau hate speech",
-                "Ikuti Syarat dan Ketentuan Discord",
-                "Dengarkan dan patuhi moderator serta admin"
-            ],
-            "rules_image": "https://cdn.discordapp.com/attachments/1321194434959691776/1321194589435023380/8da8698a5362140d0ac4499fdfce576c_1750057984927.jpg",
-            "warnings": {},
-            "auto_roles": [],
-            "translate_channel": None
-        }
+        """Update configuration for a specific server.
+
+        Raises ValueError if an option is unknown or has an invalid value.
+        """
+        config = self._get_config(guild_id).replace(updates)
+        self.configs[guild_id] = config
+        self._save_change(guild_id, config.serialize_options(updates))
+        self._notify(guild_id, set(updates))
+
+    def add_listener(self, callback):
+        """Call ``callback(guild_id, changed_keys)`` after a server's config changes.
+
+        ``changed_keys`` is ``None`` when the whole config was removed.
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, guild_id: str, changed_keys):
+        for callback in self._listeners:
+            try:
+                callback(guild_id, changed_keys)
+            except Exception as e:
+                print(f"Error in config listener: {e}")
+
+    def get_stored_configs(self) -> Dict[str, Dict[str, Any]]:
+        """Get the raw stored data of every server, including legacy options"""
+        return self.backend.load_all()
+
+    def clear_legacy_option(self, guild_id: str, key: str):
+        """Blank out a stored option that GuildConfig no longer knows about"""
+        self._save_change(guild_id, {key: None})
 
     def remove_server_config(self, guild_id: str):
         """Remove configuration for a server (when bot leaves)"""
-        if guild_id in self.configs:
-            del self.configs[guild_id]
-            self._save_configs()
+        if guild_id in self.configs or self.lazy:
+            self.configs.pop(guild_id, None)
+            self._last_used.pop(guild_id, None)
+            self._save_change(guild_id, None)
+            self._notify(guild_id, None)
 
-    def get_all_configs(self) -> Dict[str, Dict[str, Any]]:
+    def get_all_configs(self) -> Dict[str, GuildConfig]:
         """Get all server configurations"""
-        return self.configs.copy()
+        if not self.lazy:
+            return dict(self.configs)
+
+        # Read cold guilds straight from the backend without caching them
+        configs = {
+            guild_id: self._parse_stored(guild_id, config)
+            for guild_id, config in self.backend.load_all().items()
+            if guild_id not in self.configs
+        }
+        configs.update(self.configs)
+        return configs
@@ -0,0 +1,218 @@
+from dataclasses import dataclass, fields, replace as dataclass_replace
+from typing import Dict, Any, Optional, Tuple
+import json
+from bot.utils.card_layout import parse_layout
+
+DEFAULT_WELCOME_MESSAGE = "Welcome to {server}, {user}! Please read the rules and enjoy your stay."
+
+DEFAULT_RULES = (
+    "Hormati semua anggota server",
+    "Dilarang spam atau promosi berlebihan",
+    "Jaga percakapan tetap sopan dan ramah",
+    "Gunakan channel sesuai dengan tujuannya",
+    "Dilarang melakukan harassment atau hate speech",
+    "Ikuti Syarat dan Ketentuan Discord",
+    "Dengarkan dan patuhi moderator serta admin"
+)
+
+# Longest join burst window a guild can set, in seconds
+MAX_WELCOME_BURST_WINDOW = 300
+
+DEFAULT_RULES_IMAGE = "https://cdn.discordapp.com/attachments/1321194434959691776/1321194589435023380/8da8698a5362140d0ac4499fdfce576c_1750057984927.jpg"
+
+
+@dataclass(frozen=True, slots=True)
+class GuildConfig:
+    """Immutable configuration of one guild.
+
+    Defaults are module-level constants shared by every guild until a value
+    is overridden. Channel and role IDs are stored as ints.
+    """
+
+    welcome_channel: Optional[int] = None
+    welcome_message: str = DEFAULT_WELCOME_MESSAGE
+    welcome_bg_image: Optional[str] = None
+    announcement_channel: Optional[int] = None
+    mod_log_channel: Optional[int] = None
+    rules: Tuple[str, ...] = DEFAULT_RULES
+    rules_image: Optional[str] = DEFAULT_RULES_IMAGE
+    auto_roles: Tuple[int, ...] = ()
+    translate_channel: Optional[int] = None
+    # (top, bottom) RGB colours of the default welcome background, None for the built-in ones
+    welcome_gradient: Optional[Tuple[Tuple[int, int, int], Tuple[int, int, int]]] = None
+    # Welcome image encoding ("png", "webp" or "jpeg") and lossy quality, None for the bot-wide defaults
+    welcome_image_format: Optional[str] = None
+    welcome_image_quality: Optional[int] = None
+    # More than welcome_burst_threshold joins within welcome_burst_window seconds
+    # are welcomed with one digest message instead of one message each (0 disables)
+    welcome_burst_threshold: int = 5
+    welcome_burst_window: int = 10
+    # Welcome card layout as canonical JSON (see card_layout), None for the default card
+    welcome_layout: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], errors: Optional[list] = None) -> 'GuildConfig':
+        """Build a config from stored data, ignoring unknown (legacy) keys.
+
+        Options with invalid values are left at their defaults, the rest are
+        kept. A message for each invalid option is added to ``errors`` if given.
+        """
+        config = DEFAULT_CONFIG
+        for key, value in data.items():
+            if key not in _OPTIONS:
+                continue
+            try:
+                config = config.replace({key: value})
+            except ValueError as e:
+                if errors is not None:
+                    errors.append(str(e))
+        return config
+
+    def replace(self, updates: Dict[str, Any]) -> 'GuildConfig':
+        """Return a copy with ``updates`` validated and applied"""
+        parsed = {}
+        for key, value in updates.items():
+            if key not in _OPTIONS:
+                raise ValueError(f"Unknown config option: {key}")
+            value = _OPTIONS[key][0](key, value)
+            default = _DEFAULTS[key]
+            # Values equal to the default share the default object
+            parsed[key] = default if value == default else value
+        return dataclass_replace(self, **parsed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize every option to JSON-compatible values"""
+        return self.serialize_options(_OPTIONS)
+
+    def serialize_options(self, keys) -> Dict[str, Any]:
+        """Serialize only the given options, e.g. the ones just updated"""
+        return {key: _OPTIONS[key][1](getattr(self, key)) for key in keys}
+
+
+def _parse_id(key: str, value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{key} must be a Discord ID")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    raise ValueError(f"{key} must be a Discord ID")
+
+def _parse_ids(key: str, value: Any) -> Tuple[int, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, (str, bytes)) or not hasattr(value, '__iter__'):
+        raise ValueError(f"{key} must be a list of Discord IDs")
+    ids = tuple(_parse_id(key, item) for item in value)
+    if None in ids:
+        raise ValueError(f"{key} must be a list of Discord IDs")
+    return ids
+
+def _parse_str(key: str, value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"{key} must be text")
+    return value
+
+def _parse_optional_str(key: str, value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return _parse_str(key, value)
+
+def _parse_strs(key: str, value: Any) -> Tuple[str, ...]:
+    if isinstance(value, (str, bytes)) or not hasattr(value, '__iter__'):
+        raise ValueError(f"{key} must be a list of text")
+    return tuple(_parse_str(key, item) for item in value)
+
+def _parse_color(key: str, value: Any) -> Tuple[int, int, int]:
+    if isinstance(value, str):
+        text = value.lstrip('#')
+        if len(text) == 6:
+            try:
+                return tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+            except ValueError:
+                pass
+    elif isinstance(value, (list, tuple)) and len(value) == 3 and all(
+        isinstance(channel, int) and not isinstance(channel, bool) and 0 <= channel <= 255 for channel in value
+    ):
+        return tuple(value)
+    raise ValueError(f"{key} colours must be hex colours like #3498db")
+
+def _parse_gradient(key: str, value: Any) -> Optional[Tuple[Tuple[int, int, int], Tuple[int, int, int]]]:
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)) or len(value) != 2:
+        raise ValueError(f"{key} must be a pair of colours")
+    return (_parse_color(key, value[0]), _parse_color(key, value[1]))
+
+def _parse_image_format(key: str, value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if value not in ('png', 'webp', 'jpeg'):
+        raise ValueError(f"{key} must be png, webp or jpeg")
+    return value
+
+def _parse_quality(key: str, value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or not 1 <= value <= 100:
+        raise ValueError(f"{key} must be a number from 1 to 100")
+    return value
+
+def _parse_int_range(low: int, high: int):
+    def parse(key: str, value: Any) -> int:
+        if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+            raise ValueError(f"{key} must be a number from {low} to {high}")
+        return value
+    return parse
+
+def _parse_layout(key: str, value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    return parse_layout(value)
+
+# IDs are stored as strings, as they always have been in server_configs.json
+def _serialize_id(value: Optional[int]) -> Optional[str]:
+    return None if value is None else str(value)
+
+def _serialize_ids(value: Tuple[int, ...]) -> list:
+    return [str(item) for item in value]
+
+def _serialize_list(value: tuple) -> list:
+    return list(value)
+
+def _serialize_plain(value: Any) -> Any:
+    return value
+
+def _serialize_layout(value: Optional[str]) -> Optional[dict]:
+    return None if value is None else json.loads(value)
+
+def _serialize_gradient(value) -> Optional[list]:
+    if value is None:
+        return None
+    return ['#%02x%02x%02x' % color for color in value]
+
+
+# Option name -> (parser, serializer)
+_OPTIONS = {
+    'welcome_channel': (_parse_id, _serialize_id),
+    'welcome_message': (_parse_str, _serialize_plain),
+    'welcome_bg_image': (_parse_optional_str, _serialize_plain),
+    'announcement_channel': (_parse_id, _serialize_id),
+    'mod_log_channel': (_parse_id, _serialize_id),
+    'rules': (_parse_strs, _serialize_list),
+    'rules_image': (_parse_optional_str, _serialize_plain),
+    'auto_roles': (_parse_ids, _serialize_ids),
+    'translate_channel': (_parse_id, _serialize_id),
+    'welcome_gradient': (_parse_gradient, _serialize_gradient),
+    'welcome_image_format': (_parse_image_format, _serialize_plain),
+    'welcome_image_quality': (_parse_quality, _serialize_plain),
+    'welcome_burst_threshold': (_parse_int_range(0, 100), _serialize_plain),
+    'welcome_burst_window': (_parse_int_range(1, MAX_WELCOME_BURST_WINDOW), _serialize_plain),
+    'welcome_layout': (_parse_layout, _serialize_layout),
+}
+
+_DEFAULTS = {field.name: field.default for field in fields(GuildConfig)}
+
+DEFAULT_CONFIG = GuildConfig()
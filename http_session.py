@@ -0,0 +1,21 @@
+import aiohttp
+
+def create_http_session(connect_timeout=5.0, read_timeout=10.0, total_timeout=30.0,
+                        limit=100, limit_per_host=10) -> aiohttp.ClientSession:
+    """Create the long-lived HTTP session shared by the bot's downloads.
+
+    Must be called from inside the running event loop and closed on shutdown.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=300,
+        keepalive_timeout=30,
+        enable_cleanup_closed=True
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=total_timeout,
+        sock_connect=connect_timeout,
+        sock_read=read_timeout
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
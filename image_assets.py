@@ -0,0 +1,222 @@
+from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+import os
+
+# Font style -> candidate paths, tried in order
+DEFAULT_FONT_PATHS = {
+    'regular': [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "DejaVuSans.ttf",
+        "arial.ttf"
+    ],
+    'bold': [
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+        "DejaVuSans-Bold.ttf",
+        "arialbd.ttf"
+    ]
+}
+
+# Fonts tried, in order, for characters the style's font has no glyph for
+# (CJK, symbols, ...). Missing files are skipped
+DEFAULT_FALLBACK_FONT_PATHS = [
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+    "/usr/share/fonts/truetype/ancient-scripts/Symbola_hint.ttf",
+    "/usr/share/fonts/truetype/unifont/unifont.ttf"
+]
+
+# Size fonts are loaded at to check which characters they cover
+_PROBE_SIZE = 24
+
+# A code point no font has a glyph for, to get each font's "missing glyph" box
+_MISSING_CHAR = '\U0010fffd'
+
+
+class AssetRegistry:
+    """Fonts, circular masks and border rings, loaded once and reused.
+
+    Everything handed out is shared, so callers must not draw on it.
+    """
+
+    def __init__(self, font_paths=None):
+        self.configure(font_paths)
+
+    def configure(self, font_paths=None):
+        """Set the font fallback chains and drop anything already loaded.
+
+        ``font_paths`` maps a style to extra paths tried before the defaults,
+        and 'fallback' to extra fonts for characters the style's font lacks.
+        """
+        font_paths = font_paths or {}
+        self.font_paths = {
+            style: list(font_paths.get(style, [])) + paths
+            for style, paths in DEFAULT_FONT_PATHS.items()
+        }
+        self.fallback_paths = list(font_paths.get('fallback', [])) + DEFAULT_FALLBACK_FONT_PATHS
+        self._fonts = {}
+        self._chains = {}
+        # style -> {character: index of the first font in the chain covering it}
+        self._coverage = {}
+        self._missing_glyphs = {}
+        self._masks = {}
+        self._rings = {}
+        # Measuring text is the hot path of fitting it, so lengths (and the
+        # split into per-font runs) are memoized per style, size and text
+        self.text_runs = lru_cache(maxsize=4096)(self._text_runs)
+        self.text_length = lru_cache(maxsize=4096)(self._text_length)
+
+    def font(self, style, size, index=0):
+        """Get a font of the given style and size.
+
+        ``index`` picks a font of the style's fallback chain, 0 is the style's
+        own font.
+        """
+        key = (style, size, index)
+        font = self._fonts.get(key)
+        if font is None:
+            font = self._fonts[key] = self._load_font(self._chain(style)[index], size)
+        return font
+
+    def _chain(self, style):
+        """Get the paths of a style's font followed by its fallback fonts.
+
+        The style's own font is the first of its candidates that loads, or
+        None for Pillow's default font.
+        """
+        chain = self._chains.get(style)
+        if chain is None:
+            primary = None
+            for path in self.font_paths.get(style, self.font_paths['regular']):
+                try:
+                    ImageFont.truetype(path, _PROBE_SIZE)
+                    primary = path
+                    break
+                except OSError:
+                    continue
+            if primary is None:
+                print(f"No {style} font found, falling back to the default font")
+            fallbacks = [path for path in self.fallback_paths if path != primary and os.path.isfile(path)]
+            chain = self._chains[style] = (primary, *fallbacks)
+        return chain
+
+    def _load_font(self, path, size):
+        if path is not None:
+            try:
+                return ImageFont.truetype(path, size)
+            except OSError:
+                # e.g. a bitmap font that can't be loaded at this size
+                pass
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:
+            # Pillow < 10.1 has no sizable default font
+            return ImageFont.load_default()
+
+    def font_index(self, style, char):
+        """Get the index of the first font in the style's chain with a glyph for ``char``"""
+        coverage = self._coverage.setdefault(style, {})
+        index = coverage.get(char)
+        if index is None:
+            index = 0
+            if not char.isspace():
+                for candidate in range(len(self._chain(style))):
+                    if self._has_glyph(style, candidate, char):
+                        index = candidate
+                        break
+            coverage[char] = index
+        return index
+
+    def _has_glyph(self, style, index, char):
+        font = self.font(style, _PROBE_SIZE, index)
+        missing = self._missing_glyphs.get((style, index))
+        if missing is None:
+            missing = self._missing_glyphs[(style, index)] = self._glyph_mask(font, _MISSING_CHAR)
+        return self._glyph_mask(font, char) != missing
+
+    @staticmethod
+    def _glyph_mask(font, char):
+        mask = font.getmask(char)
+        return mask.size, bytes(mask)
+
+    def _text_runs(self, style, text):
+        """Split text into (font index, text) runs of characters drawn with the same font"""
+        runs = []
+        for char in text:
+            index = self.font_index(style, char)
+            if runs and runs[-1][0] == index:
+                runs[-1][1] += char
+            else:
+                runs.append([index, char])
+        return tuple((index, run) for index, run in runs)
+
+    def _text_length(self, style, size, text):
+        """Get the width of text in pixels, using fallback fonts where needed"""
+        return sum(self.font(style, size, index).getlength(run) for index, run in self.text_runs(style, text))
+
+    def fit_size(self, style, text, size, min_size, max_width):
+        """Get the largest font size from min_size to size at which text fits in max_width.
+
+        Returns min_size if the text is too wide even at that size.
+        """
+        if self.text_length(style, size, text) <= max_width:
+            return size
+        low, high = min_size, size - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.text_length(style, middle, text) <= max_width:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def truncate_text(self, style, size, text, max_width, ellipsis='\u2026'):
+        """Cut text short with an ellipsis so it fits in max_width"""
+        if self.text_length(style, size, text) <= max_width:
+            return text
+        low, high = 0, len(text) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.text_length(style, size, text[:middle].rstrip() + ellipsis) <= max_width:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low].rstrip() + ellipsis
+
+    def circle_mask(self, size):
+        """Get an 'L' mask with a filled circle of the given diameter"""
+        mask = self._masks.get(size)
+        if mask is None:
+            mask = Image.new('L', (size, size), 0)
+            draw = ImageDraw.Draw(mask)
+            draw.ellipse((0, 0, size, size), fill=255)
+            self._masks[size] = mask
+        return mask
+
+    def border_ring(self, size, border_size):
+        """Get a transparent image with a white ring around a circle of ``size``"""
+        key = (size, border_size)
+        ring = self._rings.get(key)
+        if ring is None:
+            outer = size + border_size * 2
+            ring = Image.new('RGBA', (outer, outer), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(ring)
+            draw.ellipse((0, 0, outer, outer), outline=(255, 255, 255, 255), width=border_size)
+            self._rings[key] = ring
+        return ring
+
+    def preload(self, font_sizes=(), avatar_sizes=(), border_size=4):
+        """Load the given (style, size) fonts and avatar assets up front"""
+        for style, size in font_sizes:
+            self.font(style, size)
+        for size in avatar_sizes:
+            self.circle_mask(size)
+            self.border_ring(size, border_size)
+
+
+# One registry per process; render pool processes configure their own copy
+assets = AssetRegistry()
+
+def init_assets(font_paths=None, font_sizes=(), avatar_sizes=()):
+    """Configure and preload this process's asset registry"""
+    assets.configure(font_paths)
+    assets.preload(font_sizes, avatar_sizes)
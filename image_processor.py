@@ -1,129 +1,567 @@
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageDraw, ImageFile, ImageFilter
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 import aiohttp
+import asyncio
 import io
+import itertools
 import os
+from bot.utils.avatar_cache import AvatarCache
+from bot.utils.card_layout import CARD_SIZE, DEFAULT_LAYOUT_SOURCE, DEFAULT_PLAN, compile_layout
+from bot.utils.image_assets import assets, init_assets
+
+# Top and bottom colours of the default background
+DEFAULT_GRADIENT = ((54, 57, 60), (84, 87, 90))
+
+
+# Limits for downloaded images, which may come from any URL an admin sets
+MAX_DOWNLOAD_BYTES = 8 * 1024 * 1024
+MAX_IMAGE_PIXELS = 4096 * 4096
+
+# Base layers each render process keeps, so they aren't sent with every job
+MAX_PROCESS_BASE_LAYERS = 16
+
+# Output format -> file extension
+OUTPUT_FORMATS = {'png': 'png', 'webp': 'webp', 'jpeg': 'jpg'}
+OUTPUT_FORMAT_ALIASES = {'jpg': 'jpeg'}
+
+
+class RenderQueueFull(Exception):
+    """Raised when too many renders are already waiting for the pool"""
+    pass
+
+
+class ImageRejected(Exception):
+    """Raised when a downloaded image is too large or not an image"""
+    pass
+
+
+@dataclass(frozen=True)
+class WelcomeImage:
+    """An encoded welcome image ready to be attached to a message"""
+    data: bytes
+    format: str
+
+    @property
+    def filename(self):
+        return f"welcome.{OUTPUT_FORMATS[self.format]}"
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def to_file(self):
+        """Get a file-like object for discord.File"""
+        return io.BytesIO(self.data)
+
+
+# The functions below are pure CPU work with picklable arguments, so they can
+# run in either a thread pool or a process pool.
+
+def open_image(image_data, size, max_pixels=MAX_IMAGE_PIXELS):
+    """Open the first frame of an image, decoding it no larger than needed.
+
+    JPEGs are downscaled by the decoder (by a power of two, never below
+    ``size``), which is much cheaper than decoding at full size and resizing.
+    Images over ``max_pixels`` are rejected before anything is decoded.
+    """
+    img = Image.open(io.BytesIO(image_data))
+    check_image_pixels(img, max_pixels)
+    if getattr(img, 'is_animated', False):
+        # Only the first frame of animated GIFs/WebPs is ever drawn
+        img.seek(0)
+    img.draft('RGB', size)
+    return img
+
+def check_image_pixels(img, max_pixels):
+    """Raise ImageRejected if the image has more than ``max_pixels`` pixels"""
+    if img.width * img.height > max_pixels:
+        raise ImageRejected(f"image is {img.width}x{img.height}, more than {max_pixels} pixels")
+
+def avatar_request_size(size):
+    """Smallest size Discord serves avatars at (a power of two) that covers ``size``"""
+    request_size = 16
+    while request_size < size and request_size < 4096:
+        request_size *= 2
+    return request_size
+
+def prepare_background(image_data, size=CARD_SIZE, gradient=DEFAULT_GRADIENT, max_pixels=MAX_IMAGE_PIXELS,
+                       overlay=DEFAULT_PLAN.overlay):
+    """Decode a background (or build the default gradient) and apply the overlay"""
+    if image_data:
+        background = open_image(image_data, size, max_pixels)
+        background = background.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    else:
+        background = create_default_background(size, *gradient)
+    
+    background = background.convert('RGBA')
+    if overlay is None:
+        return background
+    # Add semi-transparent overlay for better text readability
+    return Image.alpha_composite(background, Image.new('RGBA', background.size, overlay))
+
+def prepare_avatar(image_data, size, max_pixels=MAX_IMAGE_PIXELS, border_size=4):
+    """Decode an avatar and turn it into a circular avatar with border"""
+    return create_circular_avatar(open_image(image_data, (size, size), max_pixels), size, border_size)
+
+def encode_image(img, output_format='png', quality=85, compress_level=6):
+    """Encode an image as PNG, WebP or JPEG and return the bytes"""
+    img_buffer = io.BytesIO()
+    img = img.convert('RGB')
+    if output_format == 'webp':
+        img.save(img_buffer, format='WEBP', quality=quality, method=4)
+    elif output_format == 'jpeg':
+        img.save(img_buffer, format='JPEG', quality=quality, optimize=True)
+    else:
+        # PNG is lossless; quality does not apply, only the zlib level
+        img.save(img_buffer, format='PNG', compress_level=compress_level)
+    return img_buffer.getvalue()
+
+def render_welcome_image(base, avatar, values, plan, encoding=('png', 85, 6)):
+    """Draw the avatar and text layers of a render plan onto a copy of the base layer and encode it.
+
+    ``values`` maps card placeholders to their text, text layers using a
+    placeholder without a value are left out.
+    """
+    # Work on a copy of the cached background + overlay
+    img = base.copy()
+    draw = ImageDraw.Draw(img)
+    
+    if avatar and plan.avatar:
+        # Vertically centred unless the layout places it
+        avatar_y = plan.avatar.y if plan.avatar.y is not None else (img.height - avatar.height) // 2
+        img.paste(avatar, (plan.avatar.x, avatar_y), avatar)
+    
+    for layer in plan.texts:
+        text = layer.render(values)
+        if text is not None:
+            size = layer.size
+            position = layer.position
+            if layer.max_width:
+                size = assets.fit_size(layer.font, text, size, layer.min_size, layer.max_width)
+                if size == layer.min_size:
+                    text = assets.truncate_text(layer.font, size, text, layer.max_width)
+                # Keep shrunk text centred on the line it was laid out for
+                position = (position[0], position[1] + (layer.size - size) // 2)
+            draw_text(draw, position, text, layer.font, size, layer.color, layer.anchor)
+    
+    # Convert to bytes
+    return encode_image(img, *encoding)
+
+def _image_bytes(img):
+    """Memory taken by an image's pixels"""
+    return img.width * img.height * len(img.getbands())
+
+# Layer ID -> base layer, in render processes only
+_process_base_layers = OrderedDict()
+
+def render_with_cached_base(base_id, base, avatar, values, plan, encoding=('png', 85, 6)):
+    """render_welcome_image for render processes, with base layers cached by layer ID.
+
+    Pass ``base`` as None to use this process's copy of the layer. Returns
+    None if the process doesn't have it, then call again with the layer.
+    """
+    if base is None:
+        base = _process_base_layers.get(base_id)
+        if base is None:
+            return None
+        _process_base_layers.move_to_end(base_id)
+    else:
+        _process_base_layers[base_id] = base
+        while len(_process_base_layers) > MAX_PROCESS_BASE_LAYERS:
+            _process_base_layers.popitem(last=False)
+    return render_welcome_image(base, avatar, values, plan, encoding)
+
+def draw_text(draw, position, text, style, size, fill, anchor='la'):
+    """Draw text, switching to fallback fonts for characters the style's font lacks"""
+    runs = assets.text_runs(style, text)
+    if len(runs) == 1 and runs[0][0] == 0:
+        draw.text(position, text, font=assets.font(style, size), fill=fill, anchor=anchor)
+        return
+
+    # Mixed fonts: lay the runs out on the baseline of the style's font
+    x, y = position
+    width = assets.text_length(style, size, text)
+    if anchor[0] == 'm':
+        x -= width / 2
+    elif anchor[0] == 'r':
+        x -= width
+    font = assets.font(style, size)
+    if anchor[1] == 'a':
+        y += font.getmetrics()[0]
+    for index, run in runs:
+        run_font = assets.font(style, size, index)
+        draw.text((x, y), run, font=run_font, fill=fill, anchor='ls')
+        x += run_font.getlength(run)
+
+@lru_cache(maxsize=16)
+def create_default_background(size=CARD_SIZE, top=DEFAULT_GRADIENT[0], bottom=DEFAULT_GRADIENT[1]):
+    """Create a vertical gradient background from top to bottom colour"""
+    # Pillow's 256x256 black-to-white ramp, stretched to the card and
+    # mapped per channel through a lookup table, instead of a line per row
+    ramp = Image.linear_gradient('L').resize(size, Image.Resampling.BILINEAR)
+    bands = [
+        ramp.point([start + (end - start) * value // 255 for value in range(256)])
+        for start, end in zip(top, bottom)
+    ]
+    return Image.merge('RGB', bands)
+
+def create_circular_avatar(avatar_img, size, border_size=4):
+    """Create a circular avatar with border"""
+    avatar_img = avatar_img.convert('RGBA').resize((size, size), Image.Resampling.LANCZOS)
+    
+    # Apply the shared circular mask to the avatar
+    output = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+    output.paste(avatar_img, (0, 0))
+    output.putalpha(assets.circle_mask(size))
+    
+    # Paste avatar onto a copy of the shared border ring
+    border_img = assets.border_ring(size, border_size).copy()
+    border_img.paste(output, (border_size, border_size), output)
+    
+    return border_img
+
 
 class ImageProcessor:
-    def __init__(self):
-        self.default_font_size = 50
-        self.username_font_size = 60
-        self.server_font_size = 40
-        self.member_count_font_size = 30
-
-    async def create_welcome_image(self, username, server_name, avatar_url, bg_image_url=None, member_count=None):
-        """Create a welcome image with user avatar and text"""
+    def __init__(self, max_cached_backgrounds=64, avatar_cache=None, render_executor="thread",
+                 render_workers=2, max_pending_renders=32, render_timeout=10.0, font_paths=None,
+                 output_format='png', output_quality=85, png_compress_level=6,
+                 max_download_bytes=MAX_DOWNLOAD_BYTES, max_image_pixels=MAX_IMAGE_PIXELS,
+                 max_cached_renders=256, max_render_cache_bytes=32 * 1024 * 1024, member_count_bucket=1,
+                 max_background_cache_bytes=32 * 1024 * 1024):
+        # (guild_id, background URL, overlay) -> (layer ID, resized background
+        # with the overlay applied). Layer IDs are never reused, render
+        # processes cache base layers by them. An 800x400 layer takes about
+        # 1.3 MB, so the cache is bounded by both entries and bytes
+        self.max_cached_backgrounds = max_cached_backgrounds
+        self.max_background_cache_bytes = max_background_cache_bytes
+        self._base_layers = OrderedDict()
+        self._base_layer_bytes = 0
+        self._base_layer_ids = itertools.count()
+        self.card_size = CARD_SIZE
+        self.avatar_cache = avatar_cache or AvatarCache()
+        # Shared session from create_http_session(), attached by main()
+        self.session = None
+        # Downloads over max_download_bytes or images over max_image_pixels are rejected
+        self.max_download_bytes = max_download_bytes
+        self.max_image_pixels = max_image_pixels
+        # Pillow work runs in a "thread" or "process" pool; at most
+        # max_pending_renders jobs may be queued or running at once
+        self.render_executor = render_executor
+        self.render_workers = render_workers
+        self.max_pending_renders = max_pending_renders
+        self.render_timeout = render_timeout
+        self._executor = None
+        self._pending_renders = 0
+        # Global output encoding, guilds may override format and quality
+        output_format = output_format.lower()
+        output_format = OUTPUT_FORMAT_ALIASES.get(output_format, output_format)
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown welcome image format: {output_format}, use one of {', '.join(OUTPUT_FORMATS)}")
+        self.output_format = output_format
+        self.output_quality = output_quality
+        self.png_compress_level = png_compress_level
+        # Finished images of recent joins, so members leaving and rejoining (or
+        # !welcome spam) don't re-render an identical card. Cards are cached by
+        # member count rounded down to member_count_bucket, so with a bucket
+        # over 1 a cached card may show a slightly older count
+        self.max_cached_renders = max_cached_renders
+        self.max_render_cache_bytes = max_render_cache_bytes
+        self.member_count_bucket = max(1, member_count_bucket)
+        self._renders = OrderedDict()
+        self._render_cache_bytes = 0
+        self.render_cache_hits = 0
+        self.render_cache_misses = 0
+        # Output format -> number of images and total bytes, to track upload cost
+        self.output_stats = {output: {'images': 0, 'bytes': 0} for output in OUTPUT_FORMATS}
+        # Fonts and avatar masks of the default layout are loaded once here
+        # (and once per pool process), custom layouts load theirs on first use
+        self._asset_args = (font_paths, DEFAULT_PLAN.fonts, (DEFAULT_PLAN.avatar.size,))
+        init_assets(*self._asset_args)
+
+    async def create_welcome_image(self, username, server_name, avatar_url, bg_image_url=None, member_count=None, guild_id=None, avatar_key=None, gradient=None, output_format=None, output_quality=None, layout=None):
+        """Create a welcome image with user avatar and text, returns a WelcomeImage
+
+        ``layout`` is a guild's card layout as canonical JSON (see card_layout),
+        None for the default card.
+        """
         try:
-            # Create base image
-            if bg_image_url:
-                background = await self._download_image(bg_image_url)
-                if background:
-                    background = background.resize((800, 400), Image.Resampling.LANCZOS)
-                else:
-                    background = self._create_default_background()
-            else:
-                background = self._create_default_background()
-            
-            # Create a copy to work with
-            img = background.copy()
-            draw = ImageDraw.Draw(img)
+            layout = layout or DEFAULT_LAYOUT_SOURCE
+            plan = compile_layout(layout)
+            output_format = output_format or self.output_format
+            encoding = (output_format, output_quality or self.output_quality, self.png_compress_level)
             
-            # Add semi-transparent overlay for better text readability
-            overlay = Image.new('RGBA', img.size, (0, 0, 0, 100))
-            img = Image.alpha_composite(img.convert('RGBA'), overlay)
-            draw = ImageDraw.Draw(img)
+            render_key = None
+            if avatar_key:
+                # Without an avatar key the avatar behind the URL may change.
+                # Only the key uses the rounded count, renders show the real one
+                count_bucket = member_count - member_count % self.member_count_bucket if member_count else member_count
+                render_key = (
+                    guild_id, bg_image_url, gradient, layout, avatar_key, username,
+                    server_name, count_bucket, encoding, self.card_size
+                )
+                welcome_image = self._get_cached_render(render_key)
+                if welcome_image is not None:
+                    return welcome_image
             
-            # Download and process avatar
-            avatar = await self._download_image(avatar_url)
-            if avatar:
-                avatar = self._create_circular_avatar(avatar, 120)
-                # Paste avatar in the center-left area
-                avatar_x = 100
-                avatar_y = (img.height - avatar.height) // 2
-                img.paste(avatar, (avatar_x, avatar_y), avatar)
+            # Fetch the background and the avatar concurrently
+            (base_id, base), avatar = await asyncio.gather(
+                self._get_base_layer(guild_id, bg_image_url, gradient or DEFAULT_GRADIENT, plan.overlay),
+                self._get_avatar(avatar_url, avatar_key, plan.avatar)
+            )
             
-            # Add text
-            text_x = 250
-            text_start_y = 120
+            values = {
+                'user.name': username,
+                'server': server_name,
+                'server.name': server_name,
+                'member_count': str(member_count) if member_count else None
+            }
+            image_data = await self._render(base_id, base, avatar, values, plan, encoding)
             
-            # Welcome text
-            try:
-                font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", self.username_font_size)
-                font_medium = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", self.server_font_size)
-                font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", self.member_count_font_size)
-            except:
-                # Fallback to default font
-                font_large = ImageFont.load_default()
-                font_medium = ImageFont.load_default()
-                font_small = ImageFont.load_default()
-            
-            # Draw username
-            draw.text((text_x, text_start_y), f"Welcome", font=font_medium, fill=(255, 255, 255))
-            draw.text((text_x, text_start_y + 50), username, font=font_large, fill=(255, 255, 255))
-            
-            # Draw server name
-            draw.text((text_x, text_start_y + 120), f"to {server_name}", font=font_medium, fill=(200, 200, 200))
-            
-            # Draw member count if provided
-            if member_count:
-                draw.text((text_x, text_start_y + 170), f"Member #{member_count}", font=font_small, fill=(150, 150, 150))
-            
-            # Convert to bytes
-            img_buffer = io.BytesIO()
-            img.convert('RGB').save(img_buffer, format='PNG', quality=95)
-            img_buffer.seek(0)
-            
-            return img_buffer
+            stats = self.output_stats[output_format]
+            stats['images'] += 1
+            stats['bytes'] += len(image_data)
+            welcome_image = WelcomeImage(image_data, output_format)
+            if render_key:
+                self._cache_render(render_key, welcome_image)
+            return welcome_image
             
         except Exception as e:
             print(f"Error creating welcome image: {e}")
             return None
 
-    def _create_default_background(self):
-        """Create a default gradient background"""
-        img = Image.new('RGB', (800, 400), color=(54, 57, 63))
-        draw = ImageDraw.Draw(img)
-        
-        # Create a simple gradient
-        for y in range(img.height):
-            color_value = int(54 + (y / img.height) * 30)
-            draw.line([(0, y), (img.width, y)], fill=(color_value, color_value + 3, color_value + 6))
-        
-        return img
+    def avatar_fetch_size(self, layout=None):
+        """Size to request avatars at from Discord's CDN for a card layout"""
+        plan = compile_layout(layout or DEFAULT_LAYOUT_SOURCE)
+        return avatar_request_size(plan.avatar.size if plan.avatar else DEFAULT_PLAN.avatar.size)
 
-    def _create_circular_avatar(self, avatar_img, size):
-        """Create a circular avatar with border"""
-        avatar_img = avatar_img.resize((size, size), Image.Resampling.LANCZOS)
-        
-        # Create circular mask
-        mask = Image.new('L', (size, size), 0)
-        draw = ImageDraw.Draw(mask)
-        draw.ellipse((0, 0, size, size), fill=255)
-        
-        # Apply mask to avatar
-        output = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-        output.paste(avatar_img, (0, 0))
-        output.putalpha(mask)
-        
-        # Add border
-        border_size = 4
-        border_img = Image.new('RGBA', (size + border_size * 2, size + border_size * 2), (0, 0, 0, 0))
-        border_draw = ImageDraw.Draw(border_img)
-        border_draw.ellipse((0, 0, size + border_size * 2, size + border_size * 2), outline=(255, 255, 255, 255), width=border_size)
-        
-        # Paste avatar onto border
-        border_img.paste(output, (border_size, border_size), output)
+    def _get_cached_render(self, key):
+        welcome_image = self._renders.get(key)
+        if welcome_image is None:
+            self.render_cache_misses += 1
+            return None
+        self._renders.move_to_end(key)
+        self.render_cache_hits += 1
+        return welcome_image
+
+    def _cache_render(self, key, welcome_image):
+        if welcome_image.size > self.max_render_cache_bytes:
+            return
+        previous = self._renders.pop(key, None)
+        if previous is not None:
+            self._render_cache_bytes -= previous.size
+        self._renders[key] = welcome_image
+        self._render_cache_bytes += welcome_image.size
+        while len(self._renders) > self.max_cached_renders or self._render_cache_bytes > self.max_render_cache_bytes:
+            _, evicted = self._renders.popitem(last=False)
+            self._render_cache_bytes -= evicted.size
+
+    async def _render(self, base_id, base, avatar, values, plan, encoding):
+        """Draw and encode a card in the render pool"""
+        if self.render_executor != "process":
+            return await self._run_in_pool(render_welcome_image, base, avatar, values, plan, encoding)
+        # Pickling the ~1.3 MB base layer costs about as much as the render,
+        # so it is only sent to processes that don't have it yet
+        image_data = await self._run_in_pool(render_with_cached_base, base_id, None, avatar, values, plan, encoding)
+        if image_data is None:
+            image_data = await self._run_in_pool(render_with_cached_base, base_id, base, avatar, values, plan, encoding)
+        return image_data
+
+    async def _run_in_pool(self, func, *args):
+        """Run CPU-bound image work in the render pool with a timeout"""
+        if self._pending_renders >= self.max_pending_renders:
+            raise RenderQueueFull(f"{self._pending_renders} renders already pending")
         
-        return border_img
+        self._pending_renders += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # A timed out job keeps its worker busy until it finishes, but
+            # the caller stops waiting for it
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._get_executor(), func, *args),
+                self.render_timeout
+            )
+        finally:
+            self._pending_renders -= 1
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.render_executor == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.render_workers,
+                    initializer=init_assets,
+                    initargs=self._asset_args
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.render_workers, thread_name_prefix="render")
+        return self._executor
+
+    def close(self):
+        """Shut down the render pool"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _get_base_layer(self, guild_id, bg_image_url, gradient=DEFAULT_GRADIENT, overlay=DEFAULT_PLAN.overlay):
+        """Get the guild's background with the overlay applied, cached per URL.
+
+        Returns (layer ID, image).
+        """
+        # Guilds without a custom background share one entry per gradient, overlay and size
+        default_key = ('default', gradient, overlay, self.card_size)
+        key = (guild_id, bg_image_url, overlay, self.card_size) if bg_image_url else default_key
+        entry = self._base_layers.get(key)
+        if entry is not None:
+            self._base_layers.move_to_end(key)
+            return entry
+
+        base = None
+        rejected = False
+        if bg_image_url:
+            try:
+                image_data = await self._download_image(bg_image_url)
+                if image_data:
+                    base = await self._run_in_pool(
+                        prepare_background, image_data, self.card_size, gradient, self.max_image_pixels, overlay
+                    )
+            except RenderQueueFull:
+                raise
+            except ImageRejected as e:
+                print(f"Rejected background image of guild {guild_id}: {e}")
+                rejected = True
+            except Exception as e:
+                print(f"Error preparing background: {e}")
+        if base is None:
+            # Fall back to the shared default. A rejected image is pinned
+            # under the guild's key until the background changes, any
+            # other failure is retried on the next join
+            if not rejected:
+                key = default_key
+            entry = self._base_layers.get(default_key)
+            if entry is None:
+                base = await self._run_in_pool(
+                    prepare_background, None, self.card_size, gradient, self.max_image_pixels, overlay
+                )
+        if entry is None:
+            entry = (next(self._base_layer_ids), base)
+
+        self._remember_base_layer(key, entry)
+        return entry
+
+    def _remember_base_layer(self, key, entry):
+        previous = self._base_layers.pop(key, None)
+        if previous is not None:
+            self._base_layer_bytes -= _image_bytes(previous[1])
+        self._base_layers[key] = entry
+        self._base_layer_bytes += _image_bytes(entry[1])
+        # The newest layer is always kept, even if it alone is over the byte limit
+        while len(self._base_layers) > 1 and (
+                len(self._base_layers) > self.max_cached_backgrounds
+                or self._base_layer_bytes > self.max_background_cache_bytes):
+            _, evicted = self._base_layers.popitem(last=False)
+            self._base_layer_bytes -= _image_bytes(evicted[1])
+
+    async def _get_avatar(self, avatar_url, avatar_key=None, layer=DEFAULT_PLAN.avatar):
+        """Get the circular avatar for an avatar layer, from the cache when the avatar key is known"""
+        if layer is None:
+            return None  # The layout has no avatar
+        cache_key = f"{avatar_key}_{layer.size}_{layer.border}" if avatar_key else None
+        if cache_key:
+            avatar = await self.avatar_cache.get(cache_key)
+            if avatar is not None:
+                return avatar
 
-    async def _download_image(self, url):
-        """Download an image from URL"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        image_data = await response.read()
-                        return Image.open(io.BytesIO(image_data))
+            image_data = await self._download_image(avatar_url)
+            if not image_data:
+                return None
+            avatar = await self._run_in_pool(prepare_avatar, image_data, layer.size, self.max_image_pixels, layer.border)
+        except RenderQueueFull:
+            raise
+        except Exception as e:
+            print(f"Error preparing avatar: {e}")
             return None
+        if cache_key:
+            self.avatar_cache.put(cache_key, avatar)
+        return avatar
+
+    def stats(self):
+        """Get output size and cache counters"""
+        lookups = self.render_cache_hits + self.render_cache_misses
+        return {
+            'output': {
+                output: dict(counts, average_bytes=counts['bytes'] // counts['images'] if counts['images'] else 0)
+                for output, counts in self.output_stats.items()
+            },
+            'pending_renders': self._pending_renders,
+            'render_cache': {
+                'hits': self.render_cache_hits,
+                'misses': self.render_cache_misses,
+                'hit_rate': self.render_cache_hits / lookups if lookups else 0.0,
+                'items': len(self._renders),
+                'bytes': self._render_cache_bytes
+            },
+            'background_cache': {
+                'items': len(self._base_layers),
+                'bytes': self._base_layer_bytes
+            },
+            'avatar_cache': self.avatar_cache.stats()
+        }
+
+    def invalidate_background(self, guild_id):
+        """Forget cached backgrounds and images of a guild, e.g. after it sets a new background"""
+        for key in [key for key in self._base_layers if key[0] == guild_id]:
+            self._base_layer_bytes -= _image_bytes(self._base_layers.pop(key)[1])
+        for key in [key for key in self._renders if key[0] == guild_id]:
+            self._render_cache_bytes -= self._renders.pop(key).size
+
+    async def _download_image(self, url):
+        """Download raw image bytes from URL.
+
+        Raises ImageRejected for images over the size limits, returns None on
+        other errors.
+        """
+        try:
+            if self.session is None:
+                # No shared session attached (e.g. outside the bot), use a one-off one
+                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
+                    return await self._fetch_image(session, url)
+            return await self._fetch_image(self.session, url)
+        except ImageRejected:
+            raise
         except Exception as e:
             print(f"Error downloading image: {e}")
             return None
+
+    async def _fetch_image(self, session, url):
+        """Stream image bytes with the given session, enforcing the size limits"""
+        async with session.get(url) as response:
+            if response.status != 200:
+                return None
+
+            content_type = response.content_type
+            if not content_type.startswith('image/') and content_type != 'application/octet-stream':
+                raise ImageRejected(f"content type is {content_type}")
+            if response.content_length is not None and response.content_length > self.max_download_bytes:
+                raise ImageRejected(f"content length {response.content_length} is over {self.max_download_bytes} bytes")
+
+            # The parser is only fed until it has read the header, which is
+            # enough to check the dimensions before downloading the rest
+            parser = ImageFile.Parser()
+            chunks = []
+            received = 0
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                received += len(chunk)
+                if received > self.max_download_bytes:
+                    raise ImageRejected(f"image is over {self.max_download_bytes} bytes")
+                chunks.append(chunk)
+                if parser.image is None:
+                    parser.feed(chunk)
+                    if parser.image is not None:
+                        check_image_pixels(parser.image, self.max_image_pixels)
+
+            if parser.image is None:
+                raise ImageRejected("not a supported image")
+            return b''.join(chunks)
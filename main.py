@@ -11,6 +11,10 @@ from bot.commands.config import ConfigCommands
 
 from bot.events.welcome import WelcomeHandler
 from bot.utils.config_manager import ConfigManager
+from bot.utils.warnings_store import WarningStore
+from bot.utils.http_session import create_http_session
+from bot.utils.image_processor import ImageProcessor
+from bot.utils.message_dispatcher import MessageDispatcher
 
 # Bot configuration
 intents = discord.Intents.default()
@@ -21,8 +25,45 @@ intents.guilds = True
 bot = commands.Bot(command_prefix='!', intents=intents)
 
 # Initialize components
-config_manager = ConfigManager()
-welcome_handler = WelcomeHandler(bot, config_manager)
+config_manager = ConfigManager(
+    backend=os.getenv('CONFIG_BACKEND', 'json'),
+    async_writes=True,
+    flush_delay=float(os.getenv('CONFIG_FLUSH_DELAY', '2.0')),
+    max_cached_guilds=int(os.getenv('CONFIG_MAX_CACHED_GUILDS', '1000')),
+    cache_ttl=float(os.getenv('CONFIG_CACHE_TTL', '3600'))
+)
+warning_store = WarningStore()
+image_processor = ImageProcessor(
+    render_executor=os.getenv('RENDER_EXECUTOR', 'thread'),
+    render_workers=int(os.getenv('RENDER_WORKERS', '2')),
+    max_pending_renders=int(os.getenv('RENDER_MAX_PENDING', '32')),
+    render_timeout=float(os.getenv('RENDER_TIMEOUT', '10')),
+    output_format=os.getenv('WELCOME_IMAGE_FORMAT', 'png'),
+    output_quality=int(os.getenv('WELCOME_IMAGE_QUALITY', '85')),
+    max_download_bytes=int(os.getenv('IMAGE_MAX_DOWNLOAD_BYTES', str(8 * 1024 * 1024))),
+    max_image_pixels=int(os.getenv('IMAGE_MAX_PIXELS', str(4096 * 4096))),
+    max_cached_renders=int(os.getenv('WELCOME_RENDER_CACHE_SIZE', '256')),
+    max_cached_backgrounds=int(os.getenv('WELCOME_BACKGROUND_CACHE_SIZE', '64')),
+    max_background_cache_bytes=int(os.getenv('WELCOME_BACKGROUND_CACHE_BYTES', str(32 * 1024 * 1024))),
+    member_count_bucket=int(os.getenv('WELCOME_MEMBER_COUNT_BUCKET', '1')),
+    font_paths={
+        'regular': [path for path in os.getenv('WELCOME_FONT_REGULAR', '').split(os.pathsep) if path],
+        'bold': [path for path in os.getenv('WELCOME_FONT_BOLD', '').split(os.pathsep) if path],
+        'fallback': [path for path in os.getenv('WELCOME_FONT_FALLBACK', '').split(os.pathsep) if path]
+    }
+)
+# Every channel message the bot sends goes through one dispatcher
+message_dispatcher = MessageDispatcher(
+    max_queued_per_channel=int(os.getenv('DISPATCH_MAX_QUEUED_PER_CHANNEL', '100'))
+)
+welcome_handler = WelcomeHandler(
+    bot,
+    config_manager,
+    message_dispatcher,
+    image_processor,
+    max_concurrent_welcomes=int(os.getenv('WELCOME_WORKERS', '4')),
+    max_queued_welcomes=int(os.getenv('WELCOME_MAX_QUEUED', '1000'))
+)
 
 @bot.event
 async def on_ready():
@@ -45,6 +86,21 @@ async def on_ready():
 async def on_member_join(member):
     await welcome_handler.handle_member_join(member)
 
+@bot.event
+async def on_guild_role_update(before, after):
+    # Role order or permissions changed, resolve auto roles again
+    welcome_handler.invalidate_auto_roles(str(after.guild.id))
+
+@bot.event
+async def on_guild_role_delete(role):
+    welcome_handler.invalidate_auto_roles(str(role.guild.id))
+
+@bot.event
+async def on_member_update(before, after):
+    # The bot's own roles decide which auto roles it can assign
+    if after.id == bot.user.id and before.roles != after.roles:
+        welcome_handler.invalidate_auto_roles(str(after.guild.id))
+
 @bot.command(name='welcome')
 async def test_welcome(ctx):
     """Test welcome message (for testing purposes)"""
@@ -64,7 +120,10 @@ async def bot_status(request):
         "status": "online",
         "bot_name": "Akari",
         "servers": len(bot.guilds),
-        "users": total_users
+        "users": total_users,
+        "welcome_images": image_processor.stats(),
+        "welcome_queue": welcome_handler.stats(),
+        "outbound_messages": message_dispatcher.stats()
     })
 
 async def start_web_server():
@@ -82,17 +141,34 @@ async def main():
     # Start web server untuk keep alive
     await start_web_server()
     
+    # Shared HTTP session for image downloads, closed on shutdown
+    http_session = create_http_session()
+    image_processor.session = http_session
+    
+    # Move warnings still embedded in server configs into the warning store
+    warning_store.migrate_from_configs(config_manager)
+    
     # Add command cogs
     await bot.add_cog(RulesCommands(bot, config_manager))
-    await bot.add_cog(AnnouncementCommands(bot, config_manager))
-    await bot.add_cog(ModerationCommands(bot, config_manager))
+    await bot.add_cog(AnnouncementCommands(bot, config_manager, message_dispatcher))
+    await bot.add_cog(ModerationCommands(bot, config_manager, warning_store, message_dispatcher))
     await bot.add_cog(ConfigCommands(bot, config_manager))
     from bot.commands.translate import SayCommands
-    await bot.add_cog(SayCommands(bot, config_manager))
+    await bot.add_cog(SayCommands(bot, config_manager, message_dispatcher))
     
     # Get bot token from environment
     token = os.getenv('DISCORD_BOT_TOKEN', 'your_bot_token_here')
-    await bot.start(token)
+    try:
+        await bot.start(token)
+    finally:
+        # Make sure buffered config changes reach disk before exiting
+        await welcome_handler.close()
+        await message_dispatcher.close()
+        await config_manager.close()
+        warning_store.close()
+        await http_session.close()
+        await image_processor.avatar_cache.close()
+        image_processor.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
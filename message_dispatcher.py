@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# Lower values are sent first when messages wait for the same channel
+PRIORITY_MODERATION = 0
+PRIORITY_ANNOUNCEMENT = 1
+PRIORITY_COMMAND = 2
+PRIORITY_WELCOME = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_MODERATION: 'moderation',
+    PRIORITY_ANNOUNCEMENT: 'announcement',
+    PRIORITY_COMMAND: 'command',
+    PRIORITY_WELCOME: 'welcome'
+}
+
+# Discord allows at most 10 embeds per message, with at most 6000
+# characters of text across all of them
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS = 6000
+
+
+class DispatchQueueFull(Exception):
+    """Raised when a channel already has too many messages waiting"""
+    pass
+
+
+class _Outgoing:
+    __slots__ = ('priority', 'kwargs', 'coalesce_key', 'future', 'enqueued_at')
+
+    def __init__(self, priority, kwargs, coalesce_key, future):
+        self.priority = priority
+        self.kwargs = kwargs
+        self.coalesce_key = coalesce_key
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class MessageDispatcher:
+    """Sends every outgoing channel message of the bot.
+
+    Each channel has its own priority queue, sent one message at a time so a
+    burst waits here (moderation first) instead of piling up behind
+    discord.py's rate limit handling, while other channels keep sending.
+    Queued embed-only messages with the same coalesce key are merged into
+    one message of up to 10 embeds, and sent one by one if that fails.
+    """
+
+    def __init__(self, max_queued_per_channel=100):
+        self.max_queued_per_channel = max_queued_per_channel
+        # channel ID -> heap of (priority, sequence, _Outgoing)
+        self._queues = {}
+        self._workers = {}
+        self._sequence = itertools.count()
+        self.priority_stats = {
+            name: {'sent': 0, 'failed': 0, 'dropped': 0, 'coalesced': 0, 'latency_seconds': 0.0, 'max_latency_seconds': 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+        self.queued_peak = 0
+
+    async def send(self, channel, priority=PRIORITY_COMMAND, coalesce_key=None, **kwargs):
+        """Queue ``channel.send(**kwargs)`` and wait until it has been sent.
+
+        Returns the sent message. Raises DispatchQueueFull if the channel's
+        queue is full (moderation messages are always queued) and whatever
+        channel.send raised if sending failed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(channel, priority, coalesce_key, future, kwargs)
+        return await future
+
+    def _enqueue(self, channel, priority, coalesce_key, future, kwargs):
+        queue = self._queues.setdefault(channel.id, [])
+        if len(queue) >= self.max_queued_per_channel and priority != PRIORITY_MODERATION:
+            self.priority_stats[PRIORITY_NAMES[priority]]['dropped'] += 1
+            future.set_exception(DispatchQueueFull(f"{len(queue)} messages already waiting for channel {channel.id}"))
+            return
+
+        # Only messages made of a single embed can be merged
+        if coalesce_key is not None and set(kwargs) != {'embed'}:
+            coalesce_key = None
+        heapq.heappush(queue, (priority, next(self._sequence), _Outgoing(priority, kwargs, coalesce_key, future)))
+        self.queued_peak = max(self.queued_peak, self.queued())
+
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._drain(channel))
+
+    async def _drain(self, channel):
+        """Send a channel's queued messages until its queue is empty"""
+        queue = self._queues[channel.id]
+        batch = []
+        try:
+            while queue:
+                batch = self._next_batch(queue)
+                if len(batch) == 1:
+                    await self._send_one(channel, batch[0])
+                    continue
+                try:
+                    message = await channel.send(embeds=[outgoing.kwargs['embed'] for outgoing in batch])
+                except Exception as e:
+                    # Don't lose the messages because they were merged
+                    print(f"Error sending {len(batch)} merged messages, sending them one by one: {e}")
+                    for outgoing in batch:
+                        await self._send_one(channel, outgoing)
+                    continue
+                self._delivered(batch, message)
+        finally:
+            del self._workers[channel.id]
+            # Cancelled with messages left, cancel them instead of leaving callers waiting
+            for outgoing in batch + [entry[2] for entry in queue]:
+                if not outgoing.future.done():
+                    outgoing.future.cancel()
+            queue.clear()
+            del self._queues[channel.id]
+
+    async def _send_one(self, channel, outgoing):
+        """Send a single queued message as it was given"""
+        try:
+            message = await channel.send(**outgoing.kwargs)
+        except Exception as e:
+            self.priority_stats[PRIORITY_NAMES[outgoing.priority]]['failed'] += 1
+            if not outgoing.future.done():
+                outgoing.future.set_exception(e)
+            return
+        self._delivered([outgoing], message)
+
+    def _delivered(self, batch, message):
+        """Record a sent message and hand it to the callers waiting for it"""
+        stats = self.priority_stats[PRIORITY_NAMES[batch[0].priority]]
+        now = time.monotonic()
+        stats['sent'] += len(batch)
+        stats['coalesced'] += len(batch) - 1
+        for outgoing in batch:
+            latency = now - outgoing.enqueued_at
+            stats['latency_seconds'] += latency
+            stats['max_latency_seconds'] = max(stats['max_latency_seconds'], latency)
+            if not outgoing.future.done():
+                outgoing.future.set_result(message)
+
+    def _next_batch(self, queue):
+        """Pop the next message and any queued messages it can be merged with"""
+        _, _, first = heapq.heappop(queue)
+        batch = [first]
+        if first.coalesce_key is None:
+            return batch
+
+        remaining = []
+        characters = len(first.kwargs['embed'])
+        full = False
+        for entry in sorted(queue):
+            outgoing = entry[2]
+            if not full and outgoing.coalesce_key == first.coalesce_key and outgoing.priority == first.priority:
+                size = len(outgoing.kwargs['embed'])
+                # Stop at the first message that doesn't fit, to keep the order
+                full = len(batch) == MAX_EMBEDS_PER_MESSAGE or characters + size > MAX_EMBED_CHARACTERS
+                if not full:
+                    batch.append(outgoing)
+                    characters += size
+                    continue
+            remaining.append(entry)
+        if len(batch) > 1:
+            queue[:] = remaining
+            heapq.heapify(queue)
+        return batch
+
+    def queued(self):
+        """Get the number of messages waiting in all channels"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        """Get queue depth and per-priority send counters and latencies"""
+        return {
+            'queued': self.queued(),
+            'queued_peak': self.queued_peak,
+            'active_channels': len(self._workers),
+            'deepest_channel_queue': max((len(queue) for queue in self._queues.values()), default=0),
+            'priorities': {
+                name: dict(
+                    counts,
+                    average_latency_seconds=counts['latency_seconds'] / counts['sent'] if counts['sent'] else 0.0
+                )
+                for name, counts in self.priority_stats.items()
+            }
+        }
+
+    async def close(self):
+        """Stop sending, cancelling messages still queued"""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -2,13 +2,20 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from bot.utils.permissions import check_mod_permissions
+from bot.utils.message_dispatcher import PRIORITY_MODERATION
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 class ModerationCommands(commands.Cog):
-    def __init__(self, bot, config_manager):
+    WARNINGS_PER_PAGE = 5
+
+    def __init__(self, bot, config_manager, warning_store, dispatcher):
         self.bot = bot
         self.config_manager = config_manager
+        self.warning_store = warning_store
+        self.dispatcher = dispatcher
+        # Mod log entries being sent in the background
+        self._log_tasks = set()
 
     @app_commands.command(name="kick", description="Kick a member from the server")
     @app_commands.describe(
@@ -50,7 +57,7 @@ class ModerationCommands(commands.Cog):
                 )
                 embed.add_field(name="Reason", value=reason, inline=False)
                 embed.add_field(name="Moderator", value=interaction.user.mention, inline=False)
-                await member.send(embed=embed)
+                await self.dispatcher.send(member, PRIORITY_MODERATION, embed=embed)
             except:
                 pass  # User has DMs disabled
             
@@ -121,7 +128,7 @@ class ModerationCommands(commands.Cog):
                 )
                 embed.add_field(name="Reason", value=reason, inline=False)
                 embed.add_field(name="Moderator", value=interaction.user.mention, inline=False)
-                await member.send(embed=embed)
+                await self.dispatcher.send(member, PRIORITY_MODERATION, embed=embed)
             except:
                 pass  # User has DMs disabled
             
@@ -260,31 +267,18 @@ class ModerationCommands(commands.Cog):
             return
         
         try:
-            # Store warning in config
+            # Store warning
             guild_id = str(interaction.guild.id)
-            config = self.config_manager.get_server_config(guild_id)
-            
-            if 'warnings' not in config:
-                config['warnings'] = {}
-            
-            user_id = str(member.id)
-            if user_id not in config['warnings']:
-                config['warnings'][user_id] = []
-            
-            warning = {
-                'reason': reason,
-                'moderator': str(interaction.user.id),
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            config['warnings'][user_id].append(warning)
-            self.config_manager.update_server_config(guild_id, config)
+            warning_count = self.warning_store.add_warning(
+                guild_id,
+                str(member.id),
+                str(interaction.user.id),
+                reason
+            )
             
             # Log the action
             await self._log_moderation_action(interaction.guild, "Warning", member, interaction.user, reason)
             
-            warning_count = len(config['warnings'][user_id])
-            
             # Try to DM the user
             try:
                 embed = discord.Embed(
@@ -295,7 +289,7 @@ class ModerationCommands(commands.Cog):
                 embed.add_field(name="Reason", value=reason, inline=False)
                 embed.add_field(name="Moderator", value=interaction.user.mention, inline=False)
                 embed.add_field(name="Total Warnings", value=str(warning_count), inline=False)
-                await member.send(embed=embed)
+                await self.dispatcher.send(member, PRIORITY_MODERATION, embed=embed)
             except:
                 pass  # User has DMs disabled
             
@@ -317,17 +311,129 @@ class ModerationCommands(commands.Cog):
             )
             print(f"Error in warn command: {e}")
 
+    @app_commands.command(name="warnings", description="View the warnings of a member")
+    @app_commands.describe(
+        member="The member whose warnings to view",
+        page="Page number"
+    )
+    async def warnings(self, interaction: discord.Interaction, member: discord.Member, page: int = 1):
+        if not check_mod_permissions(interaction.user, interaction.guild):
+            await interaction.response.send_message(
+                "You need moderation permissions to use this command.",
+                ephemeral=True
+            )
+            return
+        
+        try:
+            guild_id = str(interaction.guild.id)
+            user_id = str(member.id)
+            warning_count = self.warning_store.count_warnings(guild_id, user_id)
+            
+            if warning_count == 0:
+                await interaction.response.send_message(
+                    f"{member.mention} has no warnings.",
+                    ephemeral=True
+                )
+                return
+            
+            total_pages = (warning_count + self.WARNINGS_PER_PAGE - 1) // self.WARNINGS_PER_PAGE
+            page = max(1, min(page, total_pages))
+            warnings = self.warning_store.get_warnings(
+                guild_id,
+                user_id,
+                limit=self.WARNINGS_PER_PAGE,
+                offset=(page - 1) * self.WARNINGS_PER_PAGE
+            )
+            
+            embed = discord.Embed(
+                title=f"Warnings for {member.display_name}",
+                description=f"Total warnings: {warning_count}",
+                color=0xf39c12
+            )
+            
+            # Number warnings per user, oldest first (the page is newest first)
+            first_number = warning_count - (page - 1) * self.WARNINGS_PER_PAGE
+            for index, warning in enumerate(warnings):
+                timestamp = datetime.fromisoformat(warning['timestamp'])
+                embed.add_field(
+                    name=f"Warning #{first_number - index}",
+                    value=(
+                        f"**Reason:** {warning['reason']}\n"
+                        f"**Moderator:** <@{warning['moderator']}>\n"
+                        f"**Date:** <t:{int(timestamp.replace(tzinfo=timezone.utc).timestamp())}:f>"
+                    ),
+                    inline=False
+                )
+            
+            embed.set_footer(text=f"Page {page}/{total_pages}")
+            
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            
+        except Exception as e:
+            await interaction.response.send_message(
+                "An error occurred while retrieving warnings. Please try again later.",
+                ephemeral=True
+            )
+            print(f"Error in warnings command: {e}")
+
+    @app_commands.command(name="clear-warnings", description="Clear all warnings of a member")
+    @app_commands.describe(
+        member="The member whose warnings to clear",
+        reason="Reason for clearing the warnings"
+    )
+    async def clear_warnings(self, interaction: discord.Interaction, member: discord.Member, reason: str = "No reason provided"):
+        if not check_mod_permissions(interaction.user, interaction.guild):
+            await interaction.response.send_message(
+                "You need moderation permissions to use this command.",
+                ephemeral=True
+            )
+            return
+        
+        try:
+            guild_id = str(interaction.guild.id)
+            removed = self.warning_store.clear_warnings(guild_id, str(member.id))
+            
+            if removed == 0:
+                await interaction.response.send_message(
+                    f"{member.mention} has no warnings.",
+                    ephemeral=True
+                )
+                return
+            
+            # Log the action
+            await self._log_moderation_action(interaction.guild, "Clear Warnings", member, interaction.user, f"{reason} ({removed} warnings removed)")
+            
+            embed = discord.Embed(
+                title="Warnings Cleared",
+                description=f"Removed {removed} warnings from {member.mention}",
+                color=0x2ecc71
+            )
+            embed.add_field(name="Reason", value=reason, inline=False)
+            embed.add_field(name="Moderator", value=interaction.user.mention, inline=False)
+            
+            await interaction.response.send_message(embed=embed)
+            
+        except Exception as e:
+            await interaction.response.send_message(
+                "An error occurred while clearing warnings. Please try again later.",
+                ephemeral=True
+            )
+            print(f"Error in clear-warnings command: {e}")
+
     async def _log_moderation_action(self, guild, action, target, moderator, reason):
-        """Log moderation actions to the configured log channel"""
+        """Log moderation actions to the configured log channel.
+
+        The entry is sent in the background, so the command can respond
+        before Discord's interaction deadline while the log channel is busy.
+        """
         try:
             guild_id = str(guild.id)
             config = self.config_manager.get_server_config(guild_id)
             
-            log_channel_id = config.get('mod_log_channel')
-            if not log_channel_id:
+            if not config.mod_log_channel:
                 return
             
-            channel = self.bot.get_channel(int(log_channel_id))
+            channel = self.bot.get_channel(config.mod_log_channel)
             if not channel:
                 return
             
@@ -341,7 +447,16 @@ class ModerationCommands(commands.Cog):
             embed.add_field(name="Moderator", value=f"{moderator.mention} ({moderator})", inline=False)
             embed.add_field(name="Reason", value=reason, inline=False)
             
-            await channel.send(embed=embed)
+            task = asyncio.create_task(self._send_log_entry(channel, embed))
+            self._log_tasks.add(task)
+            task.add_done_callback(self._log_tasks.discard)
             
         except Exception as e:
             print(f"Error logging moderation action: {e}")
+
+    async def _send_log_entry(self, channel, embed):
+        try:
+            # Log entries queued behind each other are sent as one message
+            await self.dispatcher.send(channel, PRIORITY_MODERATION, coalesce_key='mod_log', embed=embed)
+        except Exception as e:
+            print(f"Error logging moderation action: {e}")
@@ -20,27 +20,15 @@ class RulesCommands(commands.Cog):
                 description="Harap ikuti peraturan ini untuk menjaga komunitas yang nyaman:"
             )
             
-            # Default rules if not configured
-            rules_list = config.get('rules', [
-                "Be respectful to all members",
-                "No spam or excessive self-promotion",
-                "Keep conversations appropriate and family-friendly",
-                "Use channels for their intended purpose",
-                "No harassment, hate speech, or discrimination",
-                "Follow Discord Terms of Service",
-                "Listen to moderators and administrators"
-            ])
-            
             rules_text = ""
-            for i, rule in enumerate(rules_list, 1):
+            for i, rule in enumerate(config.rules, 1):
                 rules_text += f"{i}. {rule}\n"
             
             embed.add_field(name="Peraturan", value=rules_text, inline=False)
             
             # Add custom image if configured
-            rules_image = config.get('rules_image')
-            if rules_image:
-                embed.set_image(url=rules_image)
+            if config.rules_image:
+                embed.set_image(url=config.rules_image)
             
             embed.set_footer(text="Terima kasih telah membantu menjaga server kami tetap aman dan nyaman!")
             
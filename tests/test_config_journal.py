@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+from bot.utils.config_journal import ConfigJournal
+
+
+class ConfigJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.snapshot_file = os.path.join(self.directory.name, "server_configs.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_after_torn_line_is_kept(self):
+        journal = ConfigJournal(self.snapshot_file)
+        journal.write({'1': {'a': 1}})
+        journal.close()
+        # A crash in the middle of writing the next entry
+        with open(journal.journal_file, 'a', encoding='utf-8') as f:
+            f.write('{"guild":"3","se')
+
+        journal = ConfigJournal(self.snapshot_file)
+        journal.write({'2': {'b': 2}})
+        journal.close()
+
+        configs = ConfigJournal(self.snapshot_file).load_all()
+        self.assertEqual(configs, {'1': {'a': 1}, '2': {'b': 2}})
+
+        journal = ConfigJournal(self.snapshot_file)
+        journal.compact()
+        journal.close()
+        self.assertEqual(ConfigJournal(self.snapshot_file).load_all(), configs)
+
+
+if __name__ == '__main__':
+    unittest.main()
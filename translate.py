@@ -2,12 +2,18 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from bot.utils.permissions import check_admin_permissions
+from bot.utils.message_dispatcher import PRIORITY_COMMAND
 import asyncio
 
 class SayCommands(commands.Cog):
-    def __init__(self, bot, config_manager):
+    def __init__(self, bot, config_manager, dispatcher):
         self.bot = bot
         self.config_manager = config_manager
+        self.dispatcher = dispatcher
+
+    async def _send(self, ctx, content):
+        """Send a message to the command's channel through the dispatcher"""
+        return await self.dispatcher.send(ctx.channel, PRIORITY_COMMAND, content=content)
 
     @commands.command(name="say")
     async def say_command(self, ctx, *, message: str = None):
@@ -18,13 +24,13 @@ class SayCommands(commands.Cog):
 
             if not message:
                 # Kirim pesan sementara yang akan dihapus
-                temp_msg = await ctx.send("Gunakan: `!say <pesan>` untuk mengirim pesan!")
+                temp_msg = await self._send(ctx, "Gunakan: `!say <pesan>` untuk mengirim pesan!")
                 await asyncio.sleep(3)
                 await temp_msg.delete()
                 return
 
             # Kirim pesan sebagai bot
-            await ctx.send(message)
+            await self._send(ctx, message)
 
         except Exception as e:
             print(f"Error in say command: {e}")
@@ -38,7 +44,7 @@ class SayCommands(commands.Cog):
 
             if not message:
                 # Kirim pesan sementara yang akan dihapus
-                temp_msg = await ctx.send("Reply pesan orang lain terus gunakan: `!reply <pesan>`")
+                temp_msg = await self._send(ctx, "Reply pesan orang lain terus gunakan: `!reply <pesan>`")
                 await asyncio.sleep(3)
                 await temp_msg.delete()
                 return
@@ -50,15 +56,21 @@ class SayCommands(commands.Cog):
                     referenced_message = await ctx.channel.fetch_message(ctx.message.reference.message_id)
 
                     # Reply ke pesan tersebut
-                    await referenced_message.reply(message, mention_author=False)
+                    await self.dispatcher.send(
+                        ctx.channel,
+                        PRIORITY_COMMAND,
+                        content=message,
+                        reference=referenced_message,
+                        mention_author=False
+                    )
 
                 except discord.NotFound:
-                    await ctx.send("Pesan yang mau di-reply ga ditemukan!")
+                    await self._send(ctx, "Pesan yang mau di-reply ga ditemukan!")
                 except Exception as e:
-                    await ctx.send(f"Error pas reply pesan: {str(e)}")
+                    await self._send(ctx, f"Error pas reply pesan: {str(e)}")
             else:
                 # Kalau bukan reply, kirim pesan biasa
-                await ctx.send(f"**Reply:** {message}")
+                await self._send(ctx, f"**Reply:** {message}")
 
         except Exception as e:
             print(f"Error in reply command: {e}")
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+class WarningStore:
+    """Member warnings kept in their own SQLite tables, keyed by (guild, user).
+
+    Warnings are indexed by user, moderator and timestamp, and a separate
+    counts table makes warning counts O(1) to look up. Counts of the
+    max_cached_counts most recently looked up users are also kept in memory.
+    """
+
+    def __init__(self, db_file="data/warnings.db", max_cached_counts=10000):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        # (guild ID, user ID) -> warning count, least recently used first
+        self.max_cached_counts = max_cached_counts
+        self._counts = OrderedDict()
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS warnings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                moderator_id TEXT NOT NULL,
+                reason TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_warnings_user ON warnings (guild_id, user_id, id);
+            CREATE INDEX IF NOT EXISTS idx_warnings_moderator ON warnings (guild_id, moderator_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_warnings_timestamp ON warnings (guild_id, timestamp);
+            CREATE TABLE IF NOT EXISTS warning_counts (
+                guild_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (guild_id, user_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+
+    def add_warning(self, guild_id: str, user_id: str, moderator_id: str, reason: str,
+                    timestamp: Optional[str] = None) -> int:
+        """Store a warning and return the user's new warning count"""
+        timestamp = timestamp or datetime.utcnow().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._insert(guild_id, user_id, moderator_id, reason, timestamp)
+                count = self._bump_count(guild_id, user_id, 1)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._counts.pop((guild_id, user_id), None)
+                raise
+            return count
+
+    def count_warnings(self, guild_id: str, user_id: str) -> int:
+        """Get how many warnings a user has in a guild"""
+        key = (guild_id, user_id)
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+            row = self._conn.execute(
+                "SELECT count FROM warning_counts WHERE guild_id = ? AND user_id = ?",
+                key
+            ).fetchone()
+            count = row[0] if row else 0
+            self._remember_count(key, count)
+        return count
+
+    def get_warnings(self, guild_id: str, user_id: str, limit: int = 5, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get a page of a user's warnings, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, moderator_id, reason, timestamp FROM warnings "
+                "WHERE guild_id = ? AND user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                (guild_id, user_id, limit, offset)
+            ).fetchall()
+        return [
+            {'id': row[0], 'moderator': row[1], 'reason': row[2], 'timestamp': row[3]}
+            for row in rows
+        ]
+
+    def get_warnings_by_moderator(self, guild_id: str, moderator_id: str, limit: int = 5,
+                                  offset: int = 0) -> List[Dict[str, Any]]:
+        """Get a page of warnings issued by a moderator, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id, reason, timestamp FROM warnings "
+                "WHERE guild_id = ? AND moderator_id = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                (guild_id, moderator_id, limit, offset)
+            ).fetchall()
+        return [
+            {'id': row[0], 'user': row[1], 'reason': row[2], 'timestamp': row[3]}
+            for row in rows
+        ]
+
+    def clear_warnings(self, guild_id: str, user_id: str) -> int:
+        """Remove all of a user's warnings and return how many were removed"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                removed = self._conn.execute(
+                    "DELETE FROM warnings WHERE guild_id = ? AND user_id = ?",
+                    (guild_id, user_id)
+                ).rowcount
+                self._conn.execute(
+                    "DELETE FROM warning_counts WHERE guild_id = ? AND user_id = ?",
+                    (guild_id, user_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._counts.pop((guild_id, user_id), None)
+        return removed
+
+    def migrate_from_configs(self, config_manager) -> int:
+        """Move warnings embedded in guild configs into the store.
+
+        Each guild is migrated in its own transaction and its embedded
+        warnings are emptied afterwards. Once every guild is done the store
+        is marked as migrated, so later starts don't read every stored config
+        again. Returns the number of warnings migrated.
+        """
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT 1 FROM store_meta WHERE key = 'config_warnings_migrated'"
+            ).fetchone()
+        if done:
+            return 0
+
+        migrated = 0
+        for guild_id, config in config_manager.get_stored_configs().items():
+            embedded = config.get('warnings')
+            if not embedded:
+                continue
+
+            with self._lock:
+                self._conn.execute("BEGIN")
+                try:
+                    for user_id, warnings in embedded.items():
+                        for warning in warnings:
+                            self._insert(
+                                guild_id,
+                                user_id,
+                                str(warning.get('moderator', '')),
+                                warning.get('reason', 'No reason provided'),
+                                warning.get('timestamp') or datetime.utcnow().isoformat()
+                            )
+                        self._bump_count(guild_id, user_id, len(warnings))
+                        migrated += len(warnings)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    self._counts.clear()
+                    raise
+
+            config_manager.clear_legacy_option(guild_id, 'warnings')
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('config_warnings_migrated', ?)",
+                (datetime.utcnow().isoformat(),)
+            )
+        if migrated:
+            print(f"Migrated {migrated} warnings into {self.db_file}")
+        return migrated
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+    def _insert(self, guild_id, user_id, moderator_id, reason, timestamp):
+        self._conn.execute(
+            "INSERT INTO warnings (guild_id, user_id, moderator_id, reason, timestamp) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (guild_id, user_id, moderator_id, reason, timestamp)
+        )
+
+    def _bump_count(self, guild_id, user_id, amount):
+        self._conn.execute(
+            "INSERT INTO warning_counts (guild_id, user_id, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(guild_id, user_id) DO UPDATE SET count = count + excluded.count",
+            (guild_id, user_id, amount)
+        )
+        row = self._conn.execute(
+            "SELECT count FROM warning_counts WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        ).fetchone()
+        self._remember_count((guild_id, user_id), row[0])
+        return row[0]
+
+    def _remember_count(self, key, count):
+        self._counts[key] = count
+        self._counts.move_to_end(key)
+        while len(self._counts) > self.max_cached_counts:
+            self._counts.popitem(last=False)
@@ -1,14 +1,53 @@
 import discord
 from discord.ext import commands
+from collections import OrderedDict, deque
 import aiohttp
+import asyncio
 import io
+import time
+from bot.utils.guild_config import MAX_WELCOME_BURST_WINDOW
 from bot.utils.image_processor import ImageProcessor
+from bot.utils.message_dispatcher import PRIORITY_WELCOME
+from bot.utils.welcome_template import TemplateError, compile_template
 
 class WelcomeHandler:
-    def __init__(self, bot, config_manager):
+    def __init__(self, bot, config_manager, dispatcher, image_processor=None, max_concurrent_welcomes=4, max_queued_welcomes=1000):
         self.bot = bot
         self.config_manager = config_manager
-        self.image_processor = ImageProcessor()
+        self.image_processor = image_processor or ImageProcessor()
+        self.dispatcher = dispatcher
+        # guild ID -> monotonic times of joins within the guild's burst window,
+        # guilds with the least recent join first
+        self._recent_joins = OrderedDict()
+        # guild ID -> members waiting for the guild's join burst digest
+        self._digests = {}
+        self._digest_tasks = set()
+        # Welcomes are sent by max_concurrent_welcomes workers. Each guild has
+        # a FIFO of (member, enqueue time) and is in _ready_guilds while it has
+        # queued welcomes and none in flight, so a guild's welcomes are sent in
+        # join order and a raid on one guild can't starve the others
+        self.max_concurrent_welcomes = max_concurrent_welcomes
+        self.max_queued_welcomes = max_queued_welcomes
+        self._guild_queues = {}
+        self._ready_guilds = None
+        self._workers = []
+        self._queued = 0
+        self._in_flight = 0
+        self.queue_stats = {'queued_peak': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'wait_seconds': 0.0}
+        # guild ID -> auto roles the bot can assign, resolved from the config
+        self._auto_roles = {}
+        config_manager.add_listener(self._on_config_update)
+
+    def _on_config_update(self, guild_id, changed_keys):
+        """Drop cached rendering state that depends on changed options"""
+        if changed_keys is None or 'welcome_bg_image' in changed_keys:
+            self.image_processor.invalidate_background(guild_id)
+        if changed_keys is None or 'auto_roles' in changed_keys:
+            self.invalidate_auto_roles(guild_id)
+
+    def invalidate_auto_roles(self, guild_id):
+        """Forget a guild's resolved auto roles, e.g. after its roles change"""
+        self._auto_roles.pop(guild_id, None)
 
     async def handle_member_join(self, member):
         """Handle when a member joins the server"""
@@ -16,82 +55,270 @@ class WelcomeHandler:
             guild_id = str(member.guild.id)
             config = self.config_manager.get_server_config(guild_id)
             
-            welcome_channel_id = config.get('welcome_channel')
-            if not welcome_channel_id:
-                return  # No welcome channel configured
-            
-            channel = self.bot.get_channel(int(welcome_channel_id))
-            if not channel:
-                return  # Channel not found
-            
-            # Get welcome message
-            welcome_message = config.get('welcome_message', 'Welcome to {server}, {user}!')
-            welcome_message = welcome_message.replace('{user}', member.mention)
-            welcome_message = welcome_message.replace('{server}', member.guild.name)
-            
-            # Create welcome image
-            welcome_image = await self._create_welcome_image(member, config)
-            
-            embed = discord.Embed(
-                title="Welcome!",
-                description=welcome_message,
-                color=0x2ecc71
-            )
-            
-            embed.set_author(
-                name=member.display_name,
-                icon_url=member.display_avatar.url
-            )
-            
-            embed.add_field(
-                name="Member Count",
-                value=f"You are member #{member.guild.member_count}",
-                inline=False
-            )
+            # Auto assign roles right away, they never wait for the welcome
+            await self._assign_auto_roles(member, config)
             
-            embed.timestamp = discord.utils.utcnow()
+            if not config.welcome_channel:
+                return  # No welcome channel configured
             
-            # Auto assign roles
-            await self._assign_auto_roles(member, config)
+            if self._add_to_burst(guild_id, member, config):
+                return  # Welcomed in the join burst digest
             
-            if welcome_image:
-                file = discord.File(welcome_image, filename="welcome.png")
-                embed.set_image(url="attachment://welcome.png")
-                await channel.send(embed=embed, file=file)
-            else:
-                await channel.send(embed=embed)
+            self._enqueue_welcome(guild_id, member)
                 
         except Exception as e:
             print(f"Error in welcome handler: {e}")
 
+    def _enqueue_welcome(self, guild_id, member):
+        """Queue a member's welcome message for the workers"""
+        if self._queued >= self.max_queued_welcomes:
+            self.queue_stats['dropped'] += 1
+            print(f"Welcome queue full, not welcoming {member.display_name}")
+            return
+
+        self._start_workers()
+        queue = self._guild_queues.get(guild_id)
+        if queue is None:
+            queue = self._guild_queues[guild_id] = deque()
+            self._ready_guilds.put_nowait(guild_id)
+        queue.append((member, time.monotonic()))
+        self._queued += 1
+        self.queue_stats['queued_peak'] = max(self.queue_stats['queued_peak'], self._queued)
+
+    def _start_workers(self):
+        if self._workers:
+            return
+        self._ready_guilds = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._welcome_worker())
+            for _ in range(self.max_concurrent_welcomes)
+        ]
+
+    async def _welcome_worker(self):
+        """Send queued welcomes, one guild at a time"""
+        while True:
+            guild_id = await self._ready_guilds.get()
+            queue = self._guild_queues[guild_id]
+            member, enqueued_at = queue.popleft()
+            self._queued -= 1
+            self._in_flight += 1
+            self.queue_stats['wait_seconds'] += time.monotonic() - enqueued_at
+            try:
+                await self._send_welcome(member)
+                self.queue_stats['sent'] += 1
+            except Exception as e:
+                self.queue_stats['failed'] += 1
+                print(f"Error in welcome handler: {e}")
+            finally:
+                self._in_flight -= 1
+                if queue:
+                    self._ready_guilds.put_nowait(guild_id)
+                else:
+                    del self._guild_queues[guild_id]
+
+    def stats(self):
+        """Get welcome queue depth and counters"""
+        handled = self.queue_stats['sent'] + self.queue_stats['failed']
+        return {
+            'queued': self._queued,
+            'in_flight': self._in_flight,
+            'queued_guilds': len(self._guild_queues),
+            'deepest_guild_queue': max((len(queue) for queue in self._guild_queues.values()), default=0),
+            'average_wait_seconds': self.queue_stats['wait_seconds'] / handled if handled else 0.0,
+            **self.queue_stats
+        }
+
+    async def close(self):
+        """Stop the welcome workers, dropping queued welcomes and pending digests"""
+        # Digest tasks sleep for the whole burst window, don't wait for them
+        tasks = self._workers + list(self._digest_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._digests.clear()
+
+    async def _send_welcome(self, member):
+        """Render and send a member's welcome message"""
+        guild_id = str(member.guild.id)
+        config = self.config_manager.get_server_config(guild_id)
+        
+        channel = self.bot.get_channel(config.welcome_channel) if config.welcome_channel else None
+        if not channel:
+            return  # Channel not found
+        
+        # Get welcome message
+        welcome_message = self._render_message(config, member, member.guild)
+        
+        # Create welcome image
+        welcome_image = await self._create_welcome_image(member, config)
+        
+        embed = discord.Embed(
+            title="Welcome!",
+            description=welcome_message,
+            color=0x2ecc71
+        )
+        
+        embed.set_author(
+            name=member.display_name,
+            icon_url=member.display_avatar.url
+        )
+        
+        embed.add_field(
+            name="Member Count",
+            value=f"You are member #{member.guild.member_count}",
+            inline=False
+        )
+        
+        embed.timestamp = discord.utils.utcnow()
+        
+        if welcome_image:
+            file = discord.File(welcome_image.to_file(), filename=welcome_image.filename)
+            embed.set_image(url=f"attachment://{welcome_image.filename}")
+            await self.dispatcher.send(channel, PRIORITY_WELCOME, embed=embed, file=file)
+        else:
+            await self.dispatcher.send(channel, PRIORITY_WELCOME, embed=embed)
+
+    def _add_to_burst(self, guild_id, member, config):
+        """Record a join and queue it for a digest if the guild is in a join burst.
+
+        Returns True if the member will be welcomed in the digest instead of
+        with their own message.
+        """
+        if not config.welcome_burst_threshold:
+            return False
+
+        now = time.monotonic()
+        joins = self._recent_joins.pop(guild_id, None) or deque()
+        self._recent_joins[guild_id] = joins
+        joins.append(now)
+        while joins[0] <= now - config.welcome_burst_window:
+            joins.popleft()
+        # Forget guilds whose last join is past any burst window
+        while True:
+            oldest_id, oldest = next(iter(self._recent_joins.items()))
+            if oldest[-1] > now - MAX_WELCOME_BURST_WINDOW:
+                break
+            del self._recent_joins[oldest_id]
+
+        digest = self._digests.get(guild_id)
+        if digest is None:
+            if len(joins) <= config.welcome_burst_threshold:
+                return False
+            # Joiners over the threshold are collected for one window
+            digest = self._digests[guild_id] = []
+            task = asyncio.create_task(self._send_digest_later(guild_id, config.welcome_burst_window))
+            self._digest_tasks.add(task)
+            task.add_done_callback(self._digest_tasks.discard)
+        digest.append(member)
+        return True
+
+    async def _send_digest_later(self, guild_id, delay):
+        """Send a guild's join burst digest once its window has passed"""
+        await asyncio.sleep(delay)
+        members = self._digests.pop(guild_id, [])
+        try:
+            if members:
+                await self._send_digest(guild_id, members)
+        except Exception as e:
+            print(f"Error sending welcome digest: {e}")
+
+    async def _send_digest(self, guild_id, members):
+        """Welcome several members with one embed"""
+        config = self.config_manager.get_server_config(guild_id)
+        channel = self.bot.get_channel(config.welcome_channel) if config.welcome_channel else None
+        if not channel:
+            return
+
+        guild = members[0].guild
+        welcome_message = self._render_message(config, members, guild)
+
+        embed = discord.Embed(
+            title="Welcome!",
+            description=welcome_message[:4096],
+            color=0x2ecc71
+        )
+
+        embed.add_field(
+            name="Member Count",
+            value=f"{len(members)} new members joined, we are now {guild.member_count} members",
+            inline=False
+        )
+
+        embed.timestamp = discord.utils.utcnow()
+
+        await self.dispatcher.send(channel, PRIORITY_WELCOME, embed=embed)
+
+    def _render_message(self, config, members, guild):
+        """Fill in the guild's welcome message for one or more members"""
+        try:
+            template = compile_template(config.welcome_message)
+        except TemplateError:
+            # Messages set before templates were validated may not compile,
+            # show their unknown placeholders and braces as they are
+            template = compile_template(config.welcome_message, strict=False)
+        return template.render(members, guild)
+
     async def _assign_auto_roles(self, member, config):
         """Assign auto roles to new member"""
         try:
-            auto_roles = config.get('auto_roles', [])
-            if not auto_roles:
+            if not config.auto_roles:
                 return
-            
-            for role_id in auto_roles:
-                role = member.guild.get_role(int(role_id))
-                if role and role < member.guild.me.top_role:
-                    await member.add_roles(role, reason="Auto role assignment")
-                    print(f"Assigned role {role.name} to {member.display_name}")
-                elif role:
-                    print(f"Cannot assign role {role.name} - insufficient permissions")
-                else:
-                    print(f"Role with ID {role_id} not found")
+            guild_id = str(member.guild.id)
+            roles = self._get_auto_roles(member.guild, config)
+            if not roles:
+                return
+            try:
+                # One API call for all roles
+                await member.add_roles(*roles, reason="Auto role assignment")
+            except discord.Forbidden:
+                # The bot's roles or permissions changed since the roles were
+                # resolved, resolve them again and retry once
+                self.invalidate_auto_roles(guild_id)
+                roles = self._get_auto_roles(member.guild, config)
+                if not roles:
+                    return
+                await member.add_roles(*roles, reason="Auto role assignment")
+            print(f"Assigned roles {', '.join(role.name for role in roles)} to {member.display_name}")
                     
         except Exception as e:
             print(f"Error assigning auto roles: {e}")
 
+    def _get_auto_roles(self, guild, config):
+        """Get a guild's assignable auto roles, resolving them on first use"""
+        guild_id = str(guild.id)
+        roles = self._auto_roles.get(guild_id)
+        if roles is None:
+            roles = self._auto_roles[guild_id] = self._resolve_auto_roles(guild, config)
+        return roles
+
+    def _resolve_auto_roles(self, guild, config):
+        """Get the configured auto roles that exist and are below the bot's top role"""
+        if not guild.me.guild_permissions.manage_roles:
+            print(f"Cannot assign auto roles in {guild.name} - missing Manage Roles permission")
+            return ()
+        roles = []
+        for role_id in config.auto_roles:
+            role = guild.get_role(role_id)
+            if role and role < guild.me.top_role:
+                roles.append(role)
+            elif role:
+                print(f"Cannot assign role {role.name} - insufficient permissions")
+            else:
+                print(f"Role with ID {role_id} not found")
+        return tuple(roles)
+
     async def _create_welcome_image(self, member, config):
         """Create a welcome image for the member"""
         try:
             # Get background image URL
-            bg_image_url = config.get('welcome_bg_image')
+            bg_image_url = config.welcome_bg_image
             
-            # Get member avatar
-            avatar_url = str(member.display_avatar.url)
+            # Get member avatar at the size it is drawn at, as a static PNG
+            # (the first frame of animated avatars)
+            avatar_size = self.image_processor.avatar_fetch_size(config.welcome_layout)
+            avatar = member.display_avatar.replace(size=avatar_size, format='png')
+            avatar_url = str(avatar.url)
             
             # Create the welcome image
             image_buffer = await self.image_processor.create_welcome_image(
@@ -99,7 +326,13 @@ class WelcomeHandler:
                 member.guild.name,
                 avatar_url,
                 bg_image_url,
-                member.guild.member_count
+                member.guild.member_count,
+                guild_id=str(member.guild.id),
+                avatar_key=member.display_avatar.key,
+                gradient=config.welcome_gradient,
+                output_format=config.welcome_image_format,
+                output_quality=config.welcome_image_quality,
+                layout=config.welcome_layout
             )
             
             return image_buffer
@@ -0,0 +1,108 @@
+from functools import lru_cache
+import re
+
+# Members listed by name when a template is rendered for several members
+# (join burst digests), the rest are counted
+MAX_LISTED_MEMBERS = 30
+
+
+class TemplateError(ValueError):
+    """Raised for welcome messages with unknown placeholders or stray braces"""
+    pass
+
+
+def _members(attribute):
+    def value(members, guild):
+        listed = ", ".join(str(getattr(member, attribute)) for member in members[:MAX_LISTED_MEMBERS])
+        if len(members) > MAX_LISTED_MEMBERS:
+            listed += f" and {len(members) - MAX_LISTED_MEMBERS} more"
+        return listed
+    return value
+
+# Placeholder -> function of (members, guild) giving its text
+PLACEHOLDERS = {
+    'user': _members('mention'),
+    'user.mention': _members('mention'),
+    'user.name': _members('display_name'),
+    'user.id': _members('id'),
+    'server': lambda members, guild: guild.name,
+    'server.name': lambda members, guild: guild.name,
+    'server.id': lambda members, guild: str(guild.id),
+    'member_count': lambda members, guild: str(guild.member_count),
+}
+
+# {{ and }} are literal braces, {name} is a placeholder
+_TOKEN = re.compile(r'\{\{|\}\}|\{([^{}]*)\}|[{}]')
+
+
+class WelcomeTemplate:
+    """A welcome message parsed into literal text and placeholder functions"""
+
+    __slots__ = ('source', '_parts')
+
+    def __init__(self, source, parts):
+        self.source = source
+        self._parts = parts
+
+    def render(self, members, guild):
+        """Fill in the placeholders for one member or a list of members"""
+        if not isinstance(members, (list, tuple)):
+            members = (members,)
+        return "".join(
+            part if isinstance(part, str) else part(members, guild)
+            for part in self._parts
+        )
+
+
+class Field(str):
+    """A placeholder name in a parsed template"""
+    __slots__ = ()
+
+
+def parse_template(source, names, strict=True):
+    """Split a template into literal text and Field placeholders.
+
+    Raises TemplateError for placeholders not in ``names`` and stray braces.
+    With ``strict=False`` those are kept as literal text instead, and so are
+    doubled braces, like messages were shown before templates were validated.
+    """
+    parts = []
+    literal = []
+    position = 0
+    for match in _TOKEN.finditer(source):
+        literal.append(source[position:match.start()])
+        position = match.end()
+        token = match.group(0)
+        if token in ('{{', '}}'):
+            literal.append(token[0] if strict else token)
+        elif not strict and (match.group(1) is None or match.group(1).strip() not in names):
+            literal.append(token)
+        elif match.group(1) is None:
+            raise TemplateError(f"Unmatched '{token}' at position {match.start() + 1}, use '{token * 2}' for a literal brace")
+        elif match.group(1).strip() not in names:
+            raise TemplateError(
+                f"Unknown placeholder {token}, use one of "
+                + ", ".join(f"{{{name}}}" for name in names)
+            )
+        else:
+            parts.append("".join(literal))
+            literal = []
+            parts.append(Field(match.group(1).strip()))
+    literal.append(source[position:])
+    parts.append("".join(literal))
+    return tuple(part for part in parts if part != "")
+
+
+@lru_cache(maxsize=1024)
+def compile_template(source, strict=True):
+    """Parse a welcome message, raising TemplateError if it is invalid.
+
+    Compiled templates are cached by their text, so guilds sharing a message
+    (e.g. the default one) share one template. ``strict=False`` never raises,
+    see parse_template.
+    """
+    parts = tuple(
+        PLACEHOLDERS[part] if isinstance(part, Field) else part
+        for part in parse_template(source, PLACEHOLDERS, strict)
+    )
+    return WelcomeTemplate(source, parts)